@@ -37,6 +37,7 @@ v = verifitmodel.VerifitModel(
 _medrx_path = '//starfile/Dept/Research and Development/HRT/Users/CR Studies/G23 Validation/REM Target Match'
 #_medrx_path = 'C:/Users/MooTra/OneDrive - Starkey/Desktop/REM Target Match'
 mx = medrxmodel.MedRXModel(_medrx_path)
+mx.write_csv()
 
 
 #################
@@ -47,10 +48,15 @@ mx = medrxmodel.MedRXModel(_medrx_path)
 """
 print('\n'+'-'*60)
 print(f'medrx_rem_data: Preparing MedRx data...')
+# Columns to plot: measured SPLs and targets at 65 dB SPL
+_id_cols = ['filename', 'style', 'freq']
+_spl_cols = _id_cols + ['L2', 'R2']
+_target_cols = _id_cols + ['target_L2', 'target_R2']
+
 # BESTFIT
-spls = mx.bestfit.iloc[:, [0,1,2,7,8]].copy()
+spls = mx.bestfit[_spl_cols].copy()
 spls.rename(columns={'L2':'L1', 'R2':'R1'}, inplace=True)
-targets = mx.bestfit.iloc[:, [0,1,2,3,4]].copy()
+targets = mx.bestfit[_target_cols].copy()
 #targets.rename(columns={'target_L2':'L1', 'target_R2':'R1'}, inplace=True)
 
 spls = mx._to_long_format(spls)
@@ -62,9 +68,9 @@ spls['session'] = 'bestfit'
 bestfit = spls.copy()
 
 # ENDSTUDY
-spls = mx.endstudy.iloc[:, [0,1,2,7,8]].copy()
+spls = mx.endstudy[_spl_cols].copy()
 spls.rename(columns={'L2':'L1', 'R2':'R1'}, inplace=True)
-targets = mx.endstudy.iloc[:, [0,1,2,3,4]].copy()
+targets = mx.endstudy[_target_cols].copy()
 spls = mx._to_long_format(spls)
 targets = mx._to_long_format(targets)
 spls.rename(columns={'variable':'level', 'value':'measured'}, inplace=True)
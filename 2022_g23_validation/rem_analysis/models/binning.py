@@ -0,0 +1,62 @@
+""" Shared binning and relabeling functions for REM data
+
+    Vectorized replacements for the row-by-row relabeling
+    used when preparing long-format data for R.
+
+    Written by: Travis M. Moore
+    Created: Jan 20, 2023
+    Last edited: Jan 20, 2023
+"""
+
+###########
+# Imports #
+###########
+# Import data science packages
+import numpy as np
+import pandas as pd
+
+
+#############
+# Constants #
+#############
+# Frequency bands: low < 1000 Hz <= mid < 4500 Hz <= high
+FREQ_BINS = [-np.inf, 1000, 4500, np.inf]
+FREQ_LABELS = ['low', 'mid', 'high']
+
+# Collapse left and right ears by presentation level
+LEVEL_LABELS = {
+    'L1': 'soft', 'R1': 'soft',
+    'L2': 'avg', 'R2': 'avg',
+    'L3': 'loud', 'R3': 'loud'
+}
+
+# Group wired devices
+WIRED_LABELS = {
+    'CIC': 'Wired',
+    'IIC': 'Wired'
+}
+
+
+#########
+# BEGIN #
+#########
+def bin_freqs(freqs, bins=FREQ_BINS, labels=FREQ_LABELS):
+    """ Assign each frequency to a band in a single pass.
+
+        Returns:
+            A categorical series of band labels
+    """
+    freqs = pd.to_numeric(pd.Series(freqs))
+    return pd.cut(freqs, bins=bins, labels=labels, right=False)
+
+
+def relabel(values, mapping):
+    """ Replace values found in mapping; all other values are
+        left unchanged.
+
+        Returns:
+            A categorical series of the new labels
+    """
+    values = pd.Series(values).astype(object)
+    new_vals = values.map(mapping)
+    return new_vals.where(new_vals.notna(), values).astype('category')
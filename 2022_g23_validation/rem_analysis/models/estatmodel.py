@@ -11,10 +11,6 @@
 ###########
 # Imports #
 ###########
-# Import GUI packages
-import tkinter as tk
-from tkinter import filedialog
-
 # Import system packages
 import os
 from pathlib import Path
@@ -23,18 +19,28 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
+# Import custom modules
+from models import gui
+from models import tables
+
 
 #########
 # BEGIN #
 #########
 class Estatmodel:
-    def __init__(self, path=None):
+    def __init__(self, path=None, compact=True):
+        """ Parameters:
+                path: Path to directory of e-STAT .csv files
+                compact: Store long format identifier columns as 
+                    categoricals and targets as float32 (set to 
+                    False to keep object/float64 columns)
+        """
+        self.compact = compact
+
         # Check for provided path
         if not path:
             # Show file dialog to get path
-            root = tk.Tk()
-            root.withdraw()
-            path = filedialog.askdirectory()
+            path = gui.ask_directory()
             print(path)
 
         # Get list of files
@@ -173,3 +179,6 @@ class Estatmodel:
 
         # Convert values to floats and round to one decimal place
         self.estat_targets_long['estat_target'] = np.round(self.estat_targets_long['estat_target'].astype(float), 1)
+
+        if self.compact:
+            self.estat_targets_long = tables.compact(self.estat_targets_long)
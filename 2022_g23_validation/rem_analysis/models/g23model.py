@@ -13,6 +13,10 @@
 import numpy as np
 import pandas as pd
 
+# Import custom modules
+from models import binning
+from models import tables
+
 
 class G23Model():
     """ Class that does all the G23-specific juggling of 
@@ -23,11 +27,13 @@ class G23Model():
                 data, including measured minus target
                 differences
     """
-    def __init__(self, verifit, estat, form_key, session):
+    def __init__(self, verifit, estat, form_key, session, compact=True):
         self.verifit = verifit.copy()
         self.estat = estat.copy()
         self.form_key = form_key
         self.session = session
+        # Categorical/float32 layout for R export tables
+        self.compact = compact
 
 
     def get_data(self):
@@ -47,25 +53,31 @@ class G23Model():
     # Dataframe Reorganization Funcs #
     ##################################
     def _add_sub_and_form_cols(self):
-        """ Create subject column from file name
+        """ Create subject column from file name and look up 
+            each subject's form factor from the form key
         """
+        # Form factor by subject
+        forms = pd.Series(
+            {sub: vals['Form_Factor'] for sub, vals in self.form_key.items()},
+            dtype=object
+        )
+
         # Verifit
-        self.verifit.insert(loc=0, column='sub', value= '')
-        self.verifit.insert(loc=1, column='form_factor', value='')
         self.verifit.reset_index(inplace=True, drop=True)
-        for ii in range(0,len(self.verifit)):
-            # Add subject ID
-            sub = self.verifit.iloc[ii, 2].split('_')[0]
-            self.verifit.iloc[ii, 0] = sub
-            self.verifit.iloc[ii, 1] = self.form_key[sub]['Form_Factor']
-        self.verifit.sort_values(by='sub')
+        subs = self.verifit['filename'].astype(str).str.split('_', n=1).str[0]
+        form_factors = subs.map(forms)
+        missing = subs[form_factors.isna()].unique()
+        if len(missing):
+            raise KeyError(f"g23model: No form factor in form key for: {list(missing)}")
+        self.verifit.insert(loc=0, column='sub', value=subs)
+        self.verifit.insert(loc=1, column='form_factor', value=form_factors)
+        self.verifit = self.verifit.sort_values(by='sub', kind='stable')
 
         # Estat
-        self.estat.insert(loc=0, column='sub', value= '')
         self.estat.reset_index(inplace=True, drop=True)
-        for ii in range(0,len(self.estat)):
-            self.estat.loc[ii, 'sub'] = self.estat.loc[ii, 'filename'].split('_')[0]
-        self.estat.sort_values(by='sub')
+        subs = self.estat['filename'].astype(str).str.split('_', n=1).str[0]
+        self.estat.insert(loc=0, column='sub', value=subs)
+        self.estat = self.estat.sort_values(by='sub', kind='stable')
     
 
     def _filter_by_session(self):
@@ -92,8 +104,23 @@ class G23Model():
     def _get_diffs(self):
         """ Find measured SPL - e-STAT target and add a difference column
         """
-        # Add estat values to verifit dataframe
-        self.verifit['estat_target'] = list(self.estat['estat_target'])
+        # Match each Verifit row to its e-STAT target by key 
+        # rather than by row position
+        keys = ['sub', 'form_factor', 'level', 'freq']
+        estat = self.estat[keys + ['estat_target']].copy()
+        # e-STAT frequencies are read in as strings
+        estat['freq'] = estat['freq'].astype(int)
+        self.verifit['freq'] = self.verifit['freq'].astype(int)
+        merged = self.verifit.merge(estat, on=keys, how='left', 
+            validate='one_to_one', indicator=True)
+
+        # Report and drop Verifit rows without an e-STAT target
+        unmatched = merged['_merge'] == 'left_only'
+        if unmatched.any():
+            print(f"g23model: {unmatched.sum()} Verifit rows have no " +
+                "matching e-STAT target; dropping them:")
+            print(merged.loc[unmatched, keys].drop_duplicates(['sub', 'form_factor']))
+        self.verifit = merged[~unmatched].drop(columns='_merge')
 
         self.final_data = self.verifit.copy()
         # Subtract
@@ -110,15 +137,18 @@ class G23Model():
 
 
     def compare_estat(self, bestfit, endstudy):
-        common_subs = list(set(bestfit['filename'].unique()) & set(endstudy['filename'].unique()))
-        best = bestfit[bestfit['filename'].isin(common_subs)].copy()
-        end = endstudy[endstudy['filename'].isin(common_subs)].copy()
-        best.sort_values(by=['filename', 'form_factor'], inplace=True)
-        end.sort_values(by=['filename', 'form_factor'], inplace=True)
-
-        best.drop(['targets', 'measured-NAL', 'measured-target'], axis=1, inplace=True)
+        """ Match BestFit and EndStudy SPLs by subject, form factor, 
+            level and frequency and calculate the differences
+        """
+        keys = ['filename', 'form_factor', 'level', 'freq']
+        best = bestfit.drop(['targets', 'measured-NAL', 'measured-target'], axis=1)
         best.rename(columns={'measured': 'bestfit_spl'}, inplace=True)
-        best['endstudy_spl'] = list(end['measured'])
+        end = endstudy[keys + ['measured']].rename(
+            columns={'measured': 'endstudy_spl'})
+
+        # Only rows present in both sessions are kept
+        best = best.merge(end, on=keys, how='inner', validate='one_to_one')
+        best.sort_values(by=['filename', 'form_factor'], kind='stable', inplace=True)
         self.combo = best.copy()
         self.combo['best-end'] = self.combo['bestfit_spl'] - self.combo['endstudy_spl']
         self.combo['best-target'] = self.combo['bestfit_spl'] - self.combo['estat_target']
@@ -127,24 +157,15 @@ class G23Model():
 
 
     def gather_freqs(self): 
-        for ii in range(0, len(self.R['freq'])):
-            if (int(self.R.iloc[ii, 3]) < 1000):
-                self.R.iloc[ii, 3] = 'low'
-            elif (int(self.R.iloc[ii, 3]) >= 1000) and (int(self.R.iloc[ii, 3]) < 4500):
-                self.R.iloc[ii, 3] = 'mid'
-            elif (int(self.R.iloc[ii, 3]) >= 4500):
-                self.R.iloc[ii, 3] = 'high'
+        """ Relabel frequencies as low/mid/high
+        """
+        self.R['freq'] = binning.bin_freqs(self.R['freq'])
 
 
     def gather_levels(self):
-        for ii in range(0, len(self.R['level'])):
-            val = self.R.iloc[ii, 5]
-            if (val == 'L1') or (val == 'R1'):
-                self.R.iloc[ii, 5] = 'soft'
-            elif (val == 'L2') or (val == 'R2'):
-                self.R.iloc[ii, 5] = 'avg'
-            elif (val == 'L3') or (val == 'R3'):
-                self.R.iloc[ii, 5] = 'loud'
+        """ Relabel levels (L1/R1...L3/R3) as soft/avg/loud
+        """
+        self.R['level'] = binning.relabel(self.R['level'], binning.LEVEL_LABELS)
 
 
     def collapse_forms(self, data):
@@ -199,8 +220,8 @@ class G23Model():
             'end-target': 'end_minus_target'
             }, inplace=True)
 
-        # Write wide format to csv
-        self.R.to_csv('BestEndWide.csv', index=False)
+        # Write wide format to csv/parquet
+        tables.write_table(self.R, 'BestEndWide.csv')
 
         # Copy the copy df
         self.BestEndLong = self.R.copy()
@@ -218,13 +239,29 @@ class G23Model():
             value_vars=['bestfit', 'endstudy', 'estat_target']
         )
         self.BestEndLong.rename(columns={'variable': 'session'}, inplace=True)
-        self.BestEndLong.to_csv('BestEndLong.csv', index=False)
+        if self.compact:
+            self.BestEndLong = tables.compact(self.BestEndLong)
+        tables.write_table(self.BestEndLong, 'BestEndLong.csv')
+
+
+    ##################
+    # Plotting Funcs #
+    ##################
+    def _plot_page(self, verifit_model, report, data, title, calc, show=None, save=None, **kwargs):
+        """ Send a single deviation plot to the batch report, if 
+            provided, or to its own figure via plot_diffs.
+        """
+        if report:
+            report.add_page(data=data, title=title, calc=calc, **kwargs)
+        else:
+            verifit_model.plot_diffs(data=data, title=title, calc=calc, 
+                show=show, save=save, **kwargs)
 
 
     ######################################
     # Plot eSTAT BestFit - EndStudy Data #
     ######################################
-    def plot_best_minus_end(self, data, verifit_model, calc, show=None, save=None):
+    def plot_best_minus_end(self, data, verifit_model, calc, show=None, save=None, report=None):
         combo = data.copy()
         combo.rename(columns={'best-end': 'measured-target'}, inplace=True)
         plot_labels = {'ylabs': np.repeat('BestFit - Final', 3)}
@@ -233,7 +270,9 @@ class G23Model():
         for form in forms:
             temp = combo[combo['form_factor']==form]
             plot_labels['save_title'] = f"./G23 REM Data/eSTAT_best-end_{form}.png"
-            verifit_model.plot_diffs(
+            self._plot_page(
+                verifit_model=verifit_model,
+                report=report,
                 data=temp, 
                 title=f"eSTAT BestFit minus Final ({form})",
                 calc=calc,
@@ -246,7 +285,7 @@ class G23Model():
     ####################################
     # Plot eSTAT Target Deviation Data #
     ####################################
-    def plot_estat_target_deviation(self, data, session_label, verifit_model, calc, show=None, save=None):
+    def plot_estat_target_deviation(self, data, session_label, verifit_model, calc, show=None, save=None, report=None):
         print('\n'+'-'*60)
         print("g23model: Creating eSTAT Target Deviation plots...")
         plot_labels = {}
@@ -254,7 +293,9 @@ class G23Model():
         for form in forms:
             temp = data[data['form_factor']==form]
             plot_labels['save_title'] = f"./G23 REM Data/eSTAT_{session_label}_{form}.png"
-            verifit_model.plot_diffs(
+            self._plot_page(
+                verifit_model=verifit_model,
+                report=report,
                 data=temp, 
                 title=f"Measured SPL minus e-STAT Target ({form}: {session_label})",
                 calc=calc,
@@ -288,7 +329,7 @@ class G23Model():
     ######################################
     # Plot Verifit Target Deviation Data #
     ######################################
-    def plot_nal_target_deviation(self, bestfit, endstudy, verifit_model, calc, show=None, save=None):
+    def plot_nal_target_deviation(self, bestfit, endstudy, verifit_model, calc, show=None, save=None, report=None):
         best = bestfit.final_data.copy()
         end = endstudy.final_data.copy()
 
@@ -313,7 +354,9 @@ class G23Model():
             for form in forms:
                 temp = df[df['form_factor']==form]
                 plot_labels['save_title'] = f"./G23 REM Data/NAL_{labels[ii]}_{form}.png"
-                verifit_model.plot_diffs(
+                self._plot_page(
+                    verifit_model=verifit_model,
+                    report=report,
                     data=temp, 
                     title=f"Measured SPL minus NAL-NL2 Targets ({form}: {labels[ii]})",
                     calc=calc,
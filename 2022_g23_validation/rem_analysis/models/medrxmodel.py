@@ -1,96 +1,235 @@
 """ Class to hold and organzie MedRX data pulled from tech toolbox
 
     Written by: Travis M. Moore
-    Last edited: Dec 23, 2022
+    Last edited: Jan 24, 2023
 """
 
 ###########
 # Imports #
 ###########
-# Import GUI packages
-import tkinter as tk
-from tkinter import filedialog
-
 # Import system packages
-import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
+import warnings
 from pathlib import Path
 
 # Import data science packages
 import numpy as np
 import pandas as pd
 
-import matplotlib.pyplot as plt
-from matplotlib import rcParams
-rcParams.update({'figure.autolayout': True})
+# Import custom modules
+from models import binning
+from models import gui
+from models import tables
+
+
+#################
+# Column Schema #
+#################
+# MedRx header names for each canonical field. Names are 
+# compared after _normalize (lowercase; '_' and '-' as spaces).
+# The canonical names themselves (e.g., 'p_1') also match.
+COLUMN_ALIASES = {
+    'freq': ['Frequency'],
+    'reug': ['Real ear unaided gain'],
+}
+
+# Last MedRx column that isn't a measurement; columns after it 
+# are ignored
+END_COLUMN = 'Model Error'
+
+# Measurement columns in the order MedRx writes them, after the
+# Frequency column. Measurement headers without an alias are 
+# assigned to these fields in this order.
+MEASUREMENT_COLUMNS = ['target_2', 'p_2', 'p_1', 'p_3', 'end_2', 'end_1', 'end_3']
+
+
+def _normalize(name):
+    """ Lowercase a column name and treat '_' and '-' as spaces
+    """
+    name = str(name).strip().lower().replace('_', ' ').replace('-', ' ')
+    return ' '.join(name.split())
+
+
+# Normalized name: canonical field
+_LOOKUP = {_normalize(field): field for field in MEASUREMENT_COLUMNS}
+_LOOKUP.update({_normalize(alias): field 
+    for field, aliases in COLUMN_ALIASES.items() 
+    for alias in aliases + [field]})
+
+
+@lru_cache(maxsize=None)
+def resolve_columns(header):
+    """ Map MedRx column names to canonical field names. Results
+        are cached per header signature, so each distinct header
+        is only resolved once.
+
+        Columns are matched by name first (see COLUMN_ALIASES).
+        The remaining columns between Frequency and Model Error 
+        are assigned to the unmatched measurements in MedRx 
+        order (see MEASUREMENT_COLUMNS). Other columns (e.g., 
+        after Model Error, or left over) are skipped with a 
+        warning.
+
+        Parameters:
+            header: Tuple of column names from a MedRx .csv file
+
+        Returns:
+            A dict of {MedRx column name: canonical field name}
+    """
+    names = [_normalize(col) for col in header]
+    end = names.index(_normalize(END_COLUMN)) if _normalize(END_COLUMN) \
+        in names else len(header)
+
+    schema = {}
+    for col, name in zip(header, names):
+        field = _LOOKUP.get(name)
+        if field and (field not in schema.values()):
+            schema[col] = field
+
+    if 'freq' not in schema.values():
+        raise ValueError(f"medrxmodel: No frequency column in {list(header)}")
+    start = [schema.get(col) for col in header].index('freq') + 1
+
+    # Unnamed measurements, by position between the anchors
+    unmatched = [col for col in header[start:end] if col not in schema]
+    missing = [col for col in MEASUREMENT_COLUMNS if col not in schema.values()]
+    schema.update(dict(zip(unmatched, missing)))
+
+    skipped = [col for col, name in zip(header, names) 
+        if (col not in schema) and (name != _normalize(END_COLUMN))]
+    if skipped:
+        warnings.warn(f"medrxmodel: Skipping unknown MedRx columns {skipped}")
+    return schema
 
 
 #########
 # BEGIN #
 #########
 class MedRXModel:
-    def __init__(self, path=None):
-        """ Import all data files as single dataframe
+    # Frequencies kept from each MedRx export
+    FREQS = [200, 500, 800, 1400, 2000, 3000, 3900, 6300, 8100]
+
+    # Measurement columns and their order in the bestfit/endstudy 
+    # tables (after the target columns)
+    SESSIONS = {
+        'bestfit': ['p_1', 'p_2', 'p_3'],
+        'endstudy': ['end_1', 'end_2', 'end_3']
+    }
+
+    def __init__(self, path=None, compact=True, max_workers=None):
+        """ Find all MedRx .csv files. Files are read (in parallel)
+            the first time data, bestfit or endstudy is used.
+
+            Parameters:
+                path: Path to directory of MedRx .csv files
+                compact: Store identifier columns as categoricals 
+                    and values as float32 (set to False to keep 
+                    object/float64 columns)
+                max_workers: Number of threads used to read files
+                    (default: ThreadPoolExecutor default)
         """
+        self.compact = compact
+        self.max_workers = max_workers
+
         if not path:
             # Show file dialog to get path
-            root = tk.Tk()
-            root.withdraw()
-            path = filedialog.askdirectory()
+            path = gui.ask_directory()
             print(f"Path of selected folder: {path}")
 
         # Get list of file paths
         files = Path(path).glob('*.csv')
         self.files = list(files)
 
-        # Create list of frequencies for indexing
-        #self.freqs = [200, 500, 800, 1000, 1500, 2000, 3000, 4000, 6000, 8000]
-        #self.freqs = [str(val) for val in self.freqs]
 
-        self._organize_data()
+    def _read_file(self, file):
+        """ Read a single MedRx export, keeping only self.FREQS.
+            Subject, side and style are parsed from the file
+            name (sub_brand_side_style.csv) once per file.
+        """
+        sub, _, side, style = Path(file).stem.split('_')
 
+        # Only parse the columns we need
+        header = tuple(pd.read_csv(file, nrows=0).columns)
+        fields = ['freq'] + MEASUREMENT_COLUMNS
+        schema = {col: field for col, field in resolve_columns(header).items()
+            if field in fields}
+        missing = [field for field in fields if field not in schema.values()]
+        if missing:
+            raise ValueError(f"medrxmodel: No columns for {missing} in "
+                f"{Path(file).name}")
+        df = pd.read_csv(file, usecols=list(schema))
+        df = df.rename(columns=schema)[fields]
+        df = df[df['freq'].isin(self.FREQS)]
 
-    def _organize_data(self):
-        df_list = []
-        for file in self.files:
-            df = pd.read_csv(file)
-            df.insert(loc=0, column='filename', value=os.path.basename(file)[:-4])
-            # Set frequencies as index
-            #df = df.set_index(['Frequency'])
-            # Subset by desired frequencies
-            #df = df.loc[self.freqs, :]
-            df_list.append(df)
+        df.insert(loc=0, column='filename', value=sub)
+        df['side'] = side
+        df['style'] = style
+        return df
 
-        self.data = pd.concat(df_list)
-        self.data[['sub', 'brand', 'side', 'style']] = self.data['filename'].str.split('_', expand=True)
-        self.data.drop(['filename', 'brand', 'Real ear unaided gain', 'Model Error'], axis=1, inplace=True)
-        
-        # Rename columns
-        self.data.columns = ['freq', 'target_2', 'p_2', 'p_1', 'p_3', 'end_2', 'end_1', 'end_3', 'filename', 'side', 'style']
-        
-        # Grab only desired frequencies
-        bools = self.data['freq'].isin([200, 500, 800, 1400, 2000, 3000, 3900, 6300, 8100]) 
-        self.data = self.data[bools]
-
-        #Create two dfs: one for 'bestfit' and one for 'endstudy'
-        # BESTFIT
-        self.bestfit = self.data[['filename', 'style', 'freq', 'side', 'target_2', 'p_1', 'p_2', 'p_3']]
-        self.bestfit = pd.pivot(self.bestfit, index=['filename', 'style', 'freq'], columns='side', values=['target_2', 'p_1', 'p_2', 'p_3'])
-        self.bestfit.columns = ['_'.join(col) for col in self.bestfit.columns.values]
-        self.bestfit.columns = ['target_L2', 'target_R2', 'L1', 'R1', 'L2', 'R2', 'L3', 'R3']
-        self.bestfit['L2-Target'] = self.bestfit['L2'] - self.bestfit['target_L2']
-        self.bestfit['R2-Target'] = self.bestfit['R2'] - self.bestfit['target_R2']
-        self.bestfit.reset_index(inplace=True)
-        self.bestfit.to_csv('./G23 REM Data/medrx_bestfit.csv', index=False)
-        
-        # ENDSTUDY
-        self.endstudy = self.data[['filename', 'style', 'freq', 'side', 'target_2', 'end_1', 'end_2', 'end_3']]
-        self.endstudy = pd.pivot(self.endstudy, index=['filename', 'style', 'freq'], columns='side', values=['target_2', 'end_1', 'end_2', 'end_3'])
-        self.endstudy.columns = ['_'.join(col) for col in self.endstudy.columns.values]
-        self.endstudy.columns = ['target_L2', 'target_R2', 'L1', 'R1', 'L2', 'R2', 'L3', 'R3']
-        self.endstudy['L2-Target'] = self.endstudy['L2'] - self.endstudy['target_L2']
-        self.endstudy['R2-Target'] = self.endstudy['R2'] - self.endstudy['target_R2']
-        self.endstudy.reset_index(inplace=True)
-        self.endstudy.to_csv('./G23 REM Data/medrx_endstudy.csv', index=False)
+
+    @cached_property
+    def data(self):
+        """ Long table of all files: one row per file/freq
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            df_list = list(pool.map(self._read_file, self.files))
+
+        data = pd.concat(df_list, ignore_index=True)
+        if self.compact:
+            data = tables.compact(data)
+        return data
+
+
+    @cached_property
+    def _wide(self):
+        """ Single pivot of data on side, shared by bestfit and 
+            endstudy
+        """
+        values = ['target_2'] + [col for cols in self.SESSIONS.values() 
+            for col in cols]
+        return pd.pivot(self.data, index=['filename', 'style', 'freq'], 
+            columns='side', values=values)
+
+
+    def _session_table(self, session):
+        """ Build the bestfit or endstudy table from the shared
+            pivot: target_L2, target_R2, L1, R1, L2, R2, L3, R3
+        """
+        wide = self._wide
+        # Sorted side labels map to left/right
+        sides = dict(zip(sorted(wide.columns.get_level_values('side').unique()), ['L', 'R']))
+
+        df = pd.DataFrame(index=wide.index)
+        cols = ['target_2'] + self.SESSIONS[session]
+        for col in cols:
+            for side, label in sides.items():
+                if col == 'target_2':
+                    df[f"target_{label}2"] = wide[(col, side)]
+                else:
+                    df[f"{label}{col[-1]}"] = wide[(col, side)]
+
+        df['L2-Target'] = df['L2'] - df['target_L2']
+        df['R2-Target'] = df['R2'] - df['target_R2']
+        df.reset_index(inplace=True)
+        return df
+
+
+    @cached_property
+    def bestfit(self):
+        return self._session_table('bestfit')
+
+
+    @cached_property
+    def endstudy(self):
+        return self._session_table('endstudy')
+
+
+    def write_csv(self):
+        """ Write bestfit and endstudy tables to ./G23 REM Data
+        """
+        tables.write_table(self.bestfit, './G23 REM Data/medrx_bestfit.csv')
+        tables.write_table(self.endstudy, './G23 REM Data/medrx_endstudy.csv')
 
 
     def _to_long_format(self, df):
@@ -121,20 +260,14 @@ class MedRXModel:
             value_vars=['bestfit', 'endstudy', 'estat_target'])
         best.rename(columns={'variable': 'session'}, inplace=True)
 
-        for ii in range(0, len(best)):
-            # Group frequencies
-            if (best.iloc[ii, 2] < 1000):
-                best.iloc[ii, 2] = 'low'
-            elif (best.iloc[ii, 2] >= 1000) and (best.iloc[ii, 2] < 4500):
-                best.iloc[ii, 2] = 'mid'
-            elif (best.iloc[ii, 2] >= 4500):
-                best.iloc[ii, 2] = 'high'
+        # Group frequencies
+        best['freq'] = binning.bin_freqs(best['freq'])
 
-            # Group wired devices
-            if (best.iloc[ii, 1] == 'CIC') or (best.iloc[ii, 1] == 'IIC'):
-                best.iloc[ii, 1] = 'Wired'
+        # Group wired devices
+        best['form_factor'] = binning.relabel(best['form_factor'], 
+            binning.WIRED_LABELS)
 
-        best.to_csv('./G23 REM Data/medrx_long.csv', index=False)   
+        tables.write_table(best, './G23 REM Data/medrx_long.csv')
 
         return best
 
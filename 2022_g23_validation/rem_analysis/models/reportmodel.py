@@ -0,0 +1,83 @@
+""" Batch report class for REM deviation plots
+
+    Stream many VerifitModel.plot_diffs-style figures into a
+    single multi-page PDF (and optional PNGs), reusing one
+    figure/axes layout for every page.
+
+    Written by: Travis M. Moore
+    Created: Jan 18, 2023
+    Last edited: Jan 18, 2023
+"""
+
+###########
+# Imports #
+###########
+# Import custom modules
+from models import gui
+
+# Plotting packages are imported on first use (see gui.py)
+
+
+#########
+# BEGIN #
+#########
+class REMReport:
+    """ Multi-page PDF writer for REM deviation plots.
+
+        Usage:
+            with REMReport(v, 'report.pdf', png=1) as report:
+                report.add_page(data, title='...', calc='both')
+    """
+    def __init__(self, verifit_model, path, png=None):
+        """
+            Parameters:
+                verifit_model: VerifitModel instance used to draw
+                    each page
+                path: Path of the .pdf file to create
+                png: Also save each page to its 'save_title'
+                    as a .png file
+        """
+        self.v = verifit_model
+        self.path = path
+        self.png = png
+        from matplotlib.backends.backend_pdf import PdfPages
+        self.pdf = PdfPages(path)
+        self.num_pages = 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def add_page(self, data, title=None, calc=None, **kwargs):
+        """ Draw data on the shared figure and write it as the
+            next page. Accepts the same labels as plot_diffs.
+        """
+        labels = dict(kwargs)
+        save_title = labels.pop('save_title', None)
+
+        # Create the figure once; clear it for later pages
+        if self.num_pages == 0:
+            self.v._set_up_plot(**labels)
+            self.v.fig.set_size_inches(12.4, 10.8)
+        else:
+            self.v._clear_plot(**labels)
+
+        self.v._draw_diffs(data, title, calc)
+        self.pdf.savefig(self.v.fig)
+        if self.png and save_title:
+            self.v.fig.savefig(save_title)
+        self.num_pages += 1
+
+
+    def close(self):
+        """ Finish the .pdf file and release the shared figure
+        """
+        self.pdf.close()
+        if self.num_pages:
+            gui.pyplot().close(self.v.fig)
+        print(f"reportmodel: Wrote {self.num_pages} pages to {self.path}")
@@ -0,0 +1,131 @@
+""" Class to hold measured REUG from MedRx .csv files and
+    compare it to an average REUG.
+
+    All records are stored as a single records x freqs matrix,
+    so deviations and summary statistics are computed in one
+    step for every frequency.
+
+    Written by: Travis M. Moore
+    Created: Feb 09, 2023
+    Last edited: Feb 09, 2023
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+from pathlib import Path
+
+# Import data science packages
+import numpy as np
+import pandas as pd
+
+# Import custom modules
+from models import gui
+from models import medrxmodel
+from models import tables
+
+
+#############
+# Constants #
+#############
+# Average REUG (dB) at each MedRx frequency
+AVG_REUG = [0, 2, 1, 3, 4, 7, 12, 15, 16, 17, 16, 15, 15, 14, 13, 12, 10, 7, 3, 3, 2, 2, 2, 2]
+
+
+#########
+# BEGIN #
+#########
+class REUGModel:
+    def __init__(self, path=None, avg_reug=AVG_REUG):
+        """ Load the measured REUG from every MedRx .csv file
+
+            Parameters:
+                path: Path to directory of MedRx .csv files
+                avg_reug: Average REUG with one value per MedRx
+                    frequency
+        """
+        if not path:
+            # Show file dialog to get path
+            path = gui.ask_directory()
+            print(f"Path of selected folder: {path}")
+
+        # Get list of file paths
+        files = Path(path).glob('*.csv')
+        self.files = list(files)
+
+        self._organize_data()
+        self.set_average(avg_reug)
+
+
+    def _read_file(self, file):
+        """ Return the frequencies and measured REUG from a single
+            MedRx export
+        """
+        header = tuple(pd.read_csv(file, nrows=0).columns)
+        schema = {col: field for col, field
+            in medrxmodel.resolve_columns(header).items()
+            if field in ['freq', 'reug']}
+        df = pd.read_csv(file, usecols=list(schema)).rename(columns=schema)
+        return df['freq'].to_numpy(), df['reug'].to_numpy(dtype=float)
+
+
+    def _organize_data(self):
+        """ Stack all records into a records x freqs matrix
+        """
+        rows = []
+        for file in self.files:
+            freqs, reug = self._read_file(file)
+            if not rows:
+                self.freqs = freqs
+            elif not np.array_equal(freqs, self.freqs):
+                raise ValueError(f"reugmodel: Frequencies in {file.name} "
+                    "do not match the other files")
+            rows.append(reug)
+
+        self.records = [file.name for file in self.files]
+        self.measured = pd.DataFrame(np.vstack(rows), index=self.records,
+            columns=self.freqs)
+        self.measured.index.name = 'file_name'
+        self.measured.columns.name = 'freq'
+
+
+    def set_average(self, avg_reug):
+        """ Set the average REUG and recalculate deviations and
+            summary statistics
+        """
+        avg_reug = np.asarray(avg_reug, dtype=float)
+        if avg_reug.shape != self.freqs.shape:
+            raise ValueError(f"reugmodel: Average REUG has {avg_reug.size} "
+                f"values, but there are {self.freqs.size} frequencies")
+        self.avg_reug = pd.Series(avg_reug, index=self.measured.columns)
+
+        # Measured minus average for every record and frequency
+        self.deviations = self.measured - self.avg_reug
+
+        # Summary across records at each frequency
+        dev = self.deviations.to_numpy()
+        p25, p50, p75 = np.percentile(dev, [25, 50, 75], axis=0)
+        self.summary = pd.DataFrame({
+            'mean': dev.mean(axis=0),
+            'rmse': np.sqrt(np.mean(dev ** 2, axis=0)),
+            'sd': dev.std(axis=0, ddof=1) if len(dev) > 1 else np.nan,
+            'p25': p25,
+            'p50': p50,
+            'p75': p75,
+            'n': len(dev)
+            }, index=self.measured.columns)
+
+
+    def to_long(self):
+        """ Long format: one row per record and frequency with
+            columns file_name, freq, reug_avg and reug_measured
+        """
+        long = self.measured.stack().rename('reug_measured').reset_index()
+        long.insert(loc=2, column='reug_avg',
+            value=np.tile(self.avg_reug.to_numpy(), len(self.records)))
+        return long
+
+
+    def write_csv(self, title='REUG_Data.csv'):
+        tables.write_table(self.to_long(), title)
@@ -0,0 +1,156 @@
+""" Shared table functions
+
+    Compact memory layout for long-format REM and speech
+    tables, and typed Parquet/Feather copies of the tables 
+    handed to R.
+
+    Written by: Travis M. Moore
+    Created: Jan 23, 2023
+    Last edited: Jan 24, 2023
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+import os
+
+# Import data science packages
+import pandas as pd
+from pandas.api import types
+
+
+#############
+# Constants #
+#############
+# Columns that identify a row (repeated on every row in long
+# format) rather than hold a measurement
+ID_COLUMNS = ['filename', 'file', 'sub', 'subject', 'form_factor', 'style',
+    'condition', 'level', 'side', 'unit', 'environment', 'session']
+
+
+#########
+# BEGIN #
+#########
+def compact(df, id_cols=ID_COLUMNS):
+    """ Store text identifier columns as categoricals, float
+        measurements as float32 and integer measurements
+        (e.g., freq) as the smallest signed integer type
+        (int16 for audiometric frequencies). Numeric identifiers 
+        (e.g., speech subject numbers and presentation levels) 
+        are downcast like measurements.
+
+        Returns:
+            A new dataframe; df is not modified
+    """
+    df = df.copy()
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            continue
+        elif (col in id_cols) and not types.is_numeric_dtype(values):
+            df[col] = values.astype('category')
+        elif types.is_bool_dtype(values):
+            continue
+        elif types.is_float_dtype(values):
+            df[col] = values.astype('float32')
+        elif types.is_integer_dtype(values):
+            df[col] = pd.to_numeric(values, downcast='signed')
+    return df
+
+
+def _flatten_columns(df):
+    """ Join MultiIndex column labels (e.g., from pivot) with
+        underscores; Arrow formats need one string per column.
+    """
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = ['_'.join(str(x) for x in col if str(x) != '').strip('_')
+            for col in df.columns.values]
+    else:
+        df.columns = [str(col) for col in df.columns]
+    return df
+
+
+def _arrow():
+    """ Return pyarrow if it is installed, otherwise None.
+    """
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _paths(path):
+    """ Split path into the stem shared by the Arrow copies and
+        the path of the comma-separated text file. The caller's 
+        extension is kept for the text file (e.g., .txt); .csv 
+        is used when path has no extension or an Arrow one.
+    """
+    stem, ext = os.path.splitext(path)
+    if ext.lower() in ('', '.parquet', '.feather'):
+        return stem, stem + '.csv'
+    return stem, path
+
+
+def write_table(df, path, index=False, formats=('csv', 'parquet')):
+    """ Write df to path as comma-separated text (for R/Minitab) 
+        and as typed, compressed Arrow files that keep 
+        categoricals and float32/int16 columns. The Arrow copies
+        are written next to the text file, as <stem>.parquet 
+        and <stem>.feather.
+
+        Parameters:
+            df: Dataframe to write
+            path: Output path of the text file. The extension is
+                kept; .csv is added if there is none.
+            index: Write the dataframe index as columns
+            formats: Any of 'csv', 'parquet' and 'feather'. 
+                Arrow formats are skipped (with a message) if 
+                pyarrow is not installed.
+
+        Returns:
+            A list of the files written
+    """
+    stem, text_path = _paths(path)
+    written = []
+
+    if 'csv' in formats:
+        df.to_csv(text_path, index=index)
+        written.append(text_path)
+
+    arrow_formats = [f for f in formats if f in ('parquet', 'feather')]
+    if not arrow_formats:
+        return written
+    if _arrow() is None:
+        print("tables: pyarrow not found; skipping " 
+            + ", ".join(arrow_formats))
+        return written
+
+    # Arrow formats store the index as ordinary columns
+    out = df.reset_index() if index else df.reset_index(drop=True)
+    out = _flatten_columns(out)
+
+    if 'parquet' in arrow_formats:
+        out.to_parquet(stem + '.parquet', index=False, compression='zstd')
+        written.append(stem + '.parquet')
+    if 'feather' in arrow_formats:
+        out.to_feather(stem + '.feather', compression='zstd')
+        written.append(stem + '.feather')
+    return written
+
+
+def read_table(path):
+    """ Load a table written by write_table, preferring the 
+        typed .parquet/.feather files over the text file.
+
+        Returns:
+            A dataframe
+    """
+    stem, text_path = _paths(path)
+    if _arrow() is not None:
+        if os.path.exists(stem + '.parquet'):
+            return pd.read_parquet(stem + '.parquet')
+        if os.path.exists(stem + '.feather'):
+            return pd.read_feather(stem + '.feather')
+    return pd.read_csv(text_path)
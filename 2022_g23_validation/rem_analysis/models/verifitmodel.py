@@ -20,21 +20,20 @@ import numpy as np
 import pandas as pd
 import xml.etree.ElementTree as ET
 
-import matplotlib.pyplot as plt
-from matplotlib import rcParams
-rcParams.update({'figure.autolayout': True})
+# Import custom modules
+from models import gui
+from models import tables
 
 # Import system packages
 import os
 from pathlib import Path
 
-# Import GUI packages
-import tkinter as tk
-from tkinter import filedialog
+# GUI and plotting packages are imported on first use
+# (see gui.py) for headless runs
 
 
 class VerifitModel:
-    def __init__(self, path=None, test_type=None, num_curves=None, freqs=None):
+    def __init__(self, path=None, test_type=None, num_curves=None, freqs=None, compact=True):
         """ Parse verifit session file data.
         
             Parameters:
@@ -42,13 +41,14 @@ class VerifitModel:
                 test_type: Either 'on-ear' or 'test-box'
                 num_curves: The number of curves run (1 - 4)
                 freqs: The desired freqs, if different from audiometric
+                compact: Store long format identifier columns as 
+                    categoricals and values as float32 (set to 
+                    False to keep object/float64 columns)
         """
         # Get list of file paths
         if not path:
             # Show file dialog to get path
-            root = tk.Tk()
-            root.withdraw()
-            path = filedialog.askdirectory()
+            path = gui.ask_directory()
             print(path)
         # Get list of file paths
         files = Path(path).glob('*.xml')
@@ -76,6 +76,8 @@ class VerifitModel:
             self.desired_freqs = [250, 500, 750, 1000, 1500, 2000, 
                 3000, 4000, 6000, 8000]
 
+        self.compact = compact
+
 
         # Automatically import all data upon instantiation
         #self.get_all()
@@ -96,6 +98,8 @@ class VerifitModel:
         self.aided_sii.to_csv('aided_sii.csv', index=False)
         self.target_spls.to_csv('target_spls.csv', index=False)
         self.measured_spls.to_csv('measured_spls.csv', index=False)
+        if hasattr(self, 'diffs'):
+            self.write_freq_profile(title='freq_profile.csv')
         print("verifitmodel: .csv files created successfully!\n")
 
 
@@ -254,6 +258,8 @@ class VerifitModel:
             self.aided_sii_long[['unit', 'level']] = self.aided_sii_long['unit'].str.split('_', expand=True)
             column_to_move = self.aided_sii_long.pop('value')
             self.aided_sii_long.insert(len(self.aided_sii_long.columns), 'value', column_to_move)
+            if self.compact:
+                self.aided_sii_long = tables.compact(self.aided_sii_long)
             self.sii_flag = 1
         except ValueError as e:
             #print(e)
@@ -271,6 +277,8 @@ class VerifitModel:
             self.measured_spls_long[['unit', 'level']] = self.measured_spls_long['unit'].str.split('_', expand=True)
             column_to_move = self.measured_spls_long.pop('value')
             self.measured_spls_long.insert(len(self.measured_spls_long.columns), 'value', column_to_move)
+            if self.compact:
+                self.measured_spls_long = tables.compact(self.measured_spls_long)
             self.measured_flag = 1
         except ValueError as e:
             #print(e)
@@ -288,6 +296,8 @@ class VerifitModel:
             self.target_spls_long[['unit', 'level']] = self.target_spls_long['unit'].str.split('_', expand=True)
             column_to_move = self.target_spls_long.pop('value')
             self.target_spls_long.insert(len(self.target_spls_long.columns), 'value', column_to_move)
+            if self.compact:
+                self.target_spls_long = tables.compact(self.target_spls_long)
             self.target_flag = 1
         except ValueError as e:
             #print(e)
@@ -313,6 +323,8 @@ class VerifitModel:
         y['targets'] = self.target_spls_long[['value']]
         y['measured'] = self.measured_spls_long[['value']]
         y['measured-target'] = y['measured'] - y['targets']
+        if self.compact:
+            y = tables.compact(y)
         self.diffs = y.copy()
 
 
@@ -322,6 +334,7 @@ class VerifitModel:
     def _set_up_plot(self, **kwargs):
         """ Create empty plotting space for measured-target diffs
         """
+        plt = gui.pyplot()
         # Set style
         plt.style.use('seaborn-v0_8')
 
@@ -331,6 +344,18 @@ class VerifitModel:
         plt.rc('xtick', labelsize=14)
         plt.rc('ytick', labelsize=14)
 
+        # Create figure and axes
+        # Always keep a 2D (curves x sides) axes array so a single
+        # curve can be indexed the same way as multiple curves
+        self.fig, self.axs = plt.subplots(nrows=self.num_curves, ncols=2, 
+            squeeze=False)
+
+        self._label_axes(**kwargs)
+
+
+    def _label_axes(self, **kwargs):
+        """ Apply titles, labels and ticks to each empty plot
+        """
         # Check for dict of custom labels
         # Titles
         titles_default = [
@@ -353,9 +378,6 @@ class VerifitModel:
         # Define sides
         sides = [' Left', ' Right']
 
-        # Create figure and axes
-        self.fig, self.axs = plt.subplots(nrows=self.num_curves, ncols=2)
-
         # Create ticks and labels
         kHz = [x/1000 for x in self.desired_freqs]
         #for ii in [0, 2, 4, 6, 8]:
@@ -364,33 +386,90 @@ class VerifitModel:
         # Create each empty plot
         for col, side in enumerate(sides):
             for row in range(0, self.num_curves):
-                if self.num_curves > 1:
-                    self.axs[row, col].set(
-                        title=titles[row] + side,
-                        ylabel=ylabs[row],
-                        xscale='log',
-                        xticks=self.desired_freqs,
-                        xticklabels=kHz,
-                    )
-                elif self.num_curves == 1:
-                    self.axs[col].set(
-                        title=titles[row] + side,
-                        ylabel=ylabs[row],
-                        xscale='log',
-                        xticks=self.desired_freqs,
-                        xticklabels=kHz,
-                    )
+                self.axs[row, col].set(
+                    title=titles[row] + side,
+                    ylabel=ylabs[row],
+                    xscale='log',
+                    xticks=self.desired_freqs,
+                    xticklabels=kHz,
+                )
 
         # Set x label for bottom plots
-        if self.num_curves > 1:
-            for ii in range(0,2):
-                self.axs[self.num_curves-1, ii].set_xlabel('Frequency (kHz)')
-        elif self.num_curves == 1:
-            for ii in range(0,2):
-                self.axs[ii].set_xlabel('Frequency (kHz)')
+        for ii in range(0,2):
+            self.axs[self.num_curves-1, ii].set_xlabel('Frequency (kHz)')
+
+
+    def _clear_plot(self, **kwargs):
+        """ Remove all data artists from the existing figure so 
+            the same figure/axes layout can be reused.
+        """
+        for ax in self.axs.flat:
+            for artist in list(ax.lines) + list(ax.collections):
+                artist.remove()
+            if ax.get_legend():
+                ax.get_legend().remove()
+            ax.relim()
+            ax.autoscale_view()
+        self._label_axes(**kwargs)
 
 
-    def plot_ind_measured_spls(self, title=None, **kwargs):
+    def _group_traces(self, data, value_col, trace=None):
+        """ Group data once by level and file. 
+
+            Parameters:
+                trace: Optional debug hook called as 
+                    trace(filename, level, group) for each trace
+
+            Returns:
+                traces: a dict of level: list of (n_freqs, 2) 
+                    arrays of [freq, value] pairs, one per file
+        """
+        traces = {}
+        data = data.sort_values(by='freq', kind='stable')
+        grouped = data.groupby(['level', 'filename'], sort=False, observed=True)
+        for (level, file), group in grouped:
+            if trace:
+                trace(file, level, group)
+            traces.setdefault(level, []).append(
+                np.column_stack([group['freq'].to_numpy(), 
+                    group[value_col].to_numpy()])
+            )
+        return traces
+
+
+    def _plot_traces(self, traces, ylims):
+        """ Draw all individual traces for each panel as a 
+            single LineCollection.
+        """
+        plt = gui.pyplot()
+        from matplotlib.collections import LineCollection
+
+        # Cycle through the default line colors like Axes.plot
+        colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+
+        for ii in range(1, self.num_curves+1):
+            for col, side in enumerate(['L', 'R']):
+                ax = self.axs[ii-1, col]
+                segments = traces.get(side + str(ii), [])
+                if segments:
+                    ax.add_collection(LineCollection(segments, colors=colors))
+                    ax.autoscale_view(scaley=False)
+                ax.axhline(y=0, color='k')
+                # No limits to set for an empty subset
+                if np.all(np.isfinite(ylims)):
+                    ax.set_ylim(ylims)
+
+
+    def plot_ind_measured_spls(self, title=None, trace=None, show=1, save=None, **kwargs):
+        """ Plot the individual measured SPLs with the grand 
+            average at each frequency.
+
+            Parameters:
+                trace: Optional debug hook called as 
+                    trace(filename, level, group) for each plotted 
+                    line (e.g., print)
+        """
+        plt = gui.pyplot()
         labels = kwargs
         self._to_long_format()
         self._set_up_plot(**labels)
@@ -400,55 +479,65 @@ class VerifitModel:
         else:
             self.fig.suptitle(title)
 
+        data = self.measured_spls_long
+
         # Plot the individual data
-        for file in self.measured_spls_long['filename'].unique():
-            for ii in range(1, self.num_curves+1):
-                temp = self.measured_spls_long[(self.measured_spls_long['filename']==file) & (self.measured_spls_long['level']=='L' + str(ii))]
-                print(temp)
-                self.axs[ii-1,0].plot(temp['freq'], temp['value'])
-                self.axs[ii-1,0].axhline(y=0, color='k')
-                self.axs[ii-1,0].set_ylim(
-                    np.min(self.measured_spls_long['value']+(-5)),
-                    np.max(self.measured_spls_long['value']+5)
-                ) 
-
-                temp = self.measured_spls_long[(self.measured_spls_long['filename']==file) & (self.measured_spls_long['level']=='R' + str(ii))]
-                self.axs[ii-1,1].plot(temp['freq'], temp['value'])
-                self.axs[ii-1,1].axhline(y=0, color='k')
-                self.axs[ii-1,1].set_ylim(
-                    np.min(self.measured_spls_long['value']+(-5)),
-                    np.max(self.measured_spls_long['value']+5)
-                )
+        ylims = (
+            np.min(data['value']) - 5,
+            np.max(data['value']) + 5
+        )
+        self._plot_traces(self._group_traces(data, 'value', trace), ylims)
             
         # Calculate and plot grand average curve for each level
-        # Get values at all freqs for a single level
+        means = data.groupby(['level', 'freq'], observed=True)['value'].mean()
         for ii in range(1, self.num_curves+1):
-                # Filter diffs by level
-                temp = self.measured_spls_long[self.measured_spls_long['level']=='L' + str(ii)]
-                vals_by_freq = temp.groupby(['freq'])['value'].apply(np.mean)
-                self.axs[ii-1,0].plot(temp['freq'].unique(), vals_by_freq, 'ko')
+            for col, side in enumerate(['L', 'R']):
+                try:
+                    vals_by_freq = means.loc[side + str(ii)]
+                except KeyError:
+                    continue
+                self.axs[ii-1, col].plot(vals_by_freq.index, vals_by_freq, 'ko')
 
-                temp = self.measured_spls_long[self.measured_spls_long['level']=='R' + str(ii)]
-                vals_by_freq = temp.groupby(['freq'])['value'].apply(np.mean)
-                self.axs[ii-1,1].plot(temp['freq'].unique(), vals_by_freq, 'ko')
+        if save:
+            plt.savefig(labels['save_title'])
 
-        plt.show()
+        if show:
+            plt.show()
+
+        # Close plot to avoid overflow with multiple calls
+        plt.close()
 
 
     def plot_diffs(self, data, title=None, calc=None, show=None, save=None, **kwargs):
         """ Plot the individual differences between measured and 
             target SPLs
         """
+        plt = gui.pyplot()
         labels = kwargs
         
         self._set_up_plot(**labels)
+        self.fig.set_size_inches(12.4, 10.8)
+        self._draw_diffs(data, title, calc)
+
+        if save:
+            plt.savefig(labels['save_title'])
+
+        if show:
+            plt.show()
+
+        # Close plot to avoid overflow with multiple calls
+        plt.close()
+
+
+    def _draw_diffs(self, data, title=None, calc=None):
+        """ Draw the individual differences (and optional RMS/mean) 
+            on the existing figure and axes.
+        """
         if not title:
             self.fig.suptitle('Measured SPLs - NAL-NL2 Target SPLs')
         else:
             self.fig.suptitle(title)
 
-        self.fig.set_size_inches(12.4, 10.8)
-
         # Marker size
         rms_msize = 6.5
 
@@ -456,170 +545,33 @@ class VerifitModel:
         ########################
         # Plot individual data #
         ########################
-        for file in data['filename'].unique():
-            for ii in range(1,self.num_curves+1):
-                if self.num_curves > 1:
-                    temp = data[(data['filename']==file) & (data['level']=='L' + str(ii))]
-                    self.axs[ii-1,0].plot(temp['freq'].unique(), temp['measured-target'])
-                    self.axs[ii-1,0].axhline(y=0, color='k')
-                    self.axs[ii-1,0].set_ylim(
-                        np.min(data['measured-target']+(-5)),
-                        np.max(data['measured-target']+5)
-                    ) 
-
-                    temp = data[(data['filename']==file) & (data['level']=='R' + str(ii))]
-                    self.axs[ii-1,1].plot(temp['freq'].unique(), temp['measured-target'])
-                    self.axs[ii-1,1].axhline(y=0, color='k')
-                    self.axs[ii-1,1].set_ylim(
-                        np.min(data['measured-target']+(-5)),
-                        np.max(data['measured-target']+5)
-                    )
-
-
-                elif self.num_curves == 1:
-                    temp = data[(data['filename']==file) & (data['level']=='L' + str(ii))]
-                    self.axs[0].plot(temp['freq'], temp['measured-target'])
-                    self.axs[0].axhline(y=0, color='k')
-                    self.axs[0].set_ylim(
-                        np.min(data['measured-target']+(-5)),
-                        np.max(data['measured-target']+5)
-                    ) 
-
-                    temp = data[(data['filename']==file) & (data['level']=='R' + str(ii))]
-                    self.axs[1].plot(temp['freq'].unique(), temp['measured-target'])
-                    self.axs[1].axhline(y=0, color='k')
-                    self.axs[1].set_ylim(
-                        np.min(data['measured-target']+(-5)),
-                        np.max(data['measured-target']+5)
-                    )
+        # Common y limits for all panels
+        ylims = (
+            np.min(data['measured-target']) - 5,
+            np.max(data['measured-target']) + 5
+        )
+        self._plot_traces(self._group_traces(data, 'measured-target'), ylims)
 
         if calc:
             ######################
             # Plot RMS and Means #
             ######################
-            # Calculate and plot RMS and arithmetic means for each frequency and level
-            # Get values at all freqs for a single level
-            for ii in range(1,self.num_curves+1):
-
-                ###################
-                # Multiple Curves #
-                ###################
-                if self.num_curves > 1:
-                    # LEFT #
-                    # Filter diffs by level
-                    temp = data[data['level']=='L' + str(ii)]
-                    # Calculate RMS at each freq
-                    rms_by_freq = temp.groupby(['freq'])['measured-target'].apply(self.rms)
-                    # Calculate arithmetic mean at each freq
-                    means_by_freq = temp.groupby(['freq'])['measured-target'].apply(np.mean)
-
-                    if (calc == 'rms') or (calc == 'both'):
-                        # Plot RMS
-                        self.axs[ii-1,0].plot(
-                            temp['freq'].unique(), 
-                            rms_by_freq, 
-                            'ko',
-                            markersize=rms_msize,
-                            label='RMS'
-                            )
-
-                    if (calc=='mean') or (calc=='both'):
-                        # Plot arithmetic mean
-                        self.axs[ii-1,0].plot(
-                            temp['freq'].unique(), 
-                            means_by_freq,
-                            linewidth=7,
-                            color='red',
-                            ls='dotted',
-                            label='Arithmetic Mean'
-                            )
-
-                    # RIGHT #
-                    # Filter diffs by level
-                    temp = data[data['level']=='R' + str(ii)]
-                    # Calculate RMS at each freq
-                    rms_by_freq = temp.groupby(['freq'])['measured-target'].apply(self.rms)
-                    # Calculate arithmetic mean at each freq
-                    means_by_freq = temp.groupby(['freq'])['measured-target'].apply(np.mean)
-
-                    if (calc == 'rms') or (calc == 'both'):
-                        # Plot RMS
-                        self.axs[ii-1,1].plot(
-                            temp['freq'].unique(), 
-                            rms_by_freq, 
-                            'ko',
-                            markersize=rms_msize,
-                            label='RMS'
-                            )
-
-                    if (calc == 'mean') or (calc == 'both'):
-                        # Plot arithmetic mean
-                        self.axs[ii-1,1].plot(
-                            temp['freq'].unique(), 
-                            means_by_freq,
-                            linewidth=7,
-                            color='red',
-                            ls='dotted',
-                            label='Arithmetic Mean'
-                            )
-
-                    #leg_left = self.axs[ii-1,0].legend(frameon=True, loc='center', bbox_to_anchor=(0.5, -0.10))
-                    #leg_right = self.axs[ii-1,1].legend(frameon=True, loc='center', bbox_to_anchor=(0.5, -0.10))
-                    leg_left = self.axs[ii-1,0].legend(frameon=True)
-                    leg_right = self.axs[ii-1,1].legend(frameon=True)
-                    for legend in [leg_left, leg_right]:
-                        legend.get_frame().set_edgecolor('k')
-                        legend.get_frame().set_linewidth(2.0)
-
-
-                ################
-                # Single Curve #
-                ################
-                elif self.num_curves == 1:
-                    # LEFT #
-                    # Filter diffs by level
-                    temp = data[data['level']=='L' + str(ii)]
-                    # Calculate RMS at each freq
-                    rms_by_freq = temp.groupby(['freq'])['measured-target'].apply(self.rms)
-                    # Calculate arithmetic mean at each freq
-                    means_by_freq = temp.groupby(['freq'])['measured-target'].apply(np.mean)
+            # Summarize all curves/sides/frequencies in one pass
+            freq_profile = self.get_freq_profile(data)
 
-                    if (calc == 'rms') or (calc == 'both'):
-                        # Plot RMS
-                        self.axs[0].plot(
-                            temp['freq'].unique(), 
-                            rms_by_freq, 
-                            'ko',
-                            markersize=rms_msize,
-                            label='RMS'
-                            )
-
-                    if (calc == 'mean') or (calc == 'both'):
-                        # Plot arithmetic mean
-                        self.axs[0].plot(
-                            temp['freq'].unique(), 
-                            means_by_freq, 
-                            #'rD',
-                            #markersize=avg_msize,
-                            linewidth=7,
-                            color='red',
-                            ls='dotted',
-                            label='Arithmetic Mean'
-                            )
-
-                    # RIGHT #
-                    # Filter diffs by level
-                    temp = data[data['level']=='R' + str(ii)]
-                    # Calculate RMS at each freq
-                    rms_by_freq = temp.groupby(['freq'])['measured-target'].apply(self.rms)
-                    # Calculate arithmetic mean at each freq
-                    means_by_freq = temp.groupby(['freq'])['measured-target'].apply(np.mean)
+            for ii in range(1,self.num_curves+1):
+                for col, side in enumerate(['L', 'R']):
+                    ax = self.axs[ii-1, col]
+                    try:
+                        profile = freq_profile.loc[(ii, side)]
+                    except KeyError:
+                        continue
 
                     if (calc == 'rms') or (calc == 'both'):
                         # Plot RMS
-                        self.axs[1].plot(
-                            temp['freq'].unique(), 
-                            rms_by_freq, 
+                        ax.plot(
+                            profile.index, 
+                            profile['rms'], 
                             'ko',
                             markersize=rms_msize,
                             label='RMS'
@@ -627,32 +579,71 @@ class VerifitModel:
 
                     if (calc == 'mean') or (calc == 'both'):
                         # Plot arithmetic mean
-                        self.axs[1].plot(
-                            temp['freq'].unique(), 
-                            means_by_freq, 
-                            #'rD',
-                            #markersize=avg_msize,
+                        ax.plot(
+                            profile.index, 
+                            profile['mean'],
                             linewidth=7,
                             color='red',
                             ls='dotted',
                             label='Arithmetic Mean'
                             )
 
-                    leg_left = self.axs[0].legend(frameon=True)
-                    leg_right = self.axs[1].legend(frameon=True)
-                    for legend in [leg_left, leg_right]:
-                        legend.get_frame().set_edgecolor('k')
-                        legend.get_frame().set_linewidth(2.0)
-
-        if save:
-            plt.savefig(labels['save_title'])
-
-        if show:
-            plt.show()
+                    legend = ax.legend(frameon=True)
+                    legend.get_frame().set_edgecolor('k')
+                    legend.get_frame().set_linewidth(2.0)
 
-        # Close plot to avoid overflow with multiple calls
-        plt.close()
 
+    def get_freq_profile(self, data, value_col='measured-target', by=None):
+        """ Summarize value_col at each frequency for every curve 
+            and side using built-in groupby reductions.
 
-    def rms(self, vals):
-        return np.sqrt(np.mean(np.square(vals)))
+            Parameters:
+                data: Long data with level, freq and value_col 
+                    columns (e.g., self.diffs)
+                value_col: Column to summarize
+                by: Optional list of extra grouping columns 
+                    (e.g., ['form_factor'])
+
+            Returns:
+                profile: a dataframe indexed by (by..., curve, side, 
+                    freq) with mean, rms, sd (ddof=1), n, and 
+                    25th/50th/75th percentile columns
+        """
+        by = list(by) if by else []
+        df = data[by + ['level', 'freq', value_col]].copy()
+        df['squared'] = np.square(df[value_col])
+
+        # Level labels are side + curve number (e.g., 'L1')
+        grouped = df.groupby(by + ['level', 'freq'], observed=True)
+        profile = grouped[value_col].agg(['mean', 'std', 'count'])
+        profile['rms'] = np.sqrt(grouped['squared'].mean())
+        pctls = grouped[value_col].quantile([0.25, 0.5, 0.75]).unstack()
+        pctls = pctls.reindex(columns=[0.25, 0.5, 0.75])
+        pctls.columns = ['p25', 'p50', 'p75']
+        profile = profile.join(pctls)
+        profile.rename(columns={'std': 'sd', 'count': 'n'}, inplace=True)
+
+        # Split level into curve and side
+        profile.reset_index(inplace=True)
+        level = profile.pop('level').astype(str)
+        profile.insert(loc=len(by), column='curve', value=level.str[1:].astype(int))
+        profile.insert(loc=len(by) + 1, column='side', value=level.str[0])
+        profile.set_index(by + ['curve', 'side', 'freq'], inplace=True)
+        profile.sort_index(inplace=True)
+        return profile[['mean', 'rms', 'sd', 'n', 'p25', 'p50', 'p75']]
+
+
+    def write_freq_profile(self, data=None, title=None, **kwargs):
+        """ Write the frequency profile (see get_freq_profile) of 
+            data (default: self.diffs) to .csv/.parquet.
+
+            Returns:
+                The profile
+        """
+        if data is None:
+            data = self.diffs
+        if not title:
+            title = 'freq_profile.csv'
+        profile = self.get_freq_profile(data, **kwargs)
+        tables.write_table(profile, title, index=True)
+        return profile
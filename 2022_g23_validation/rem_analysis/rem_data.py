@@ -34,6 +34,7 @@ import seaborn as sn
 from models import verifitmodel
 from models import estatmodel
 from models import g23model
+from models import reportmodel
 
 
 ##########################
@@ -83,25 +84,40 @@ endstudy.final_data.to_csv('./G23 REM Data/estat_endstudy.csv', index=False)
 #######################
 # Call Plotting Funcs #
 #######################
+# Write all deviation plots to a single multi-page report
+# (plus individual .png files)
+report = reportmodel.REMReport(v, './G23 REM Data/REM_deviation_report.pdf', png=1)
+
 # Plot eSTAT target deviation
 # BESTFIT
 #bestfit.plot_estat_target_deviation(bestfit, endstudy, v, calc='both', show=None, save=1)
 best_collapsed = bestfit.collapse_forms(bestfit.final_data)
-bestfit.plot_estat_target_deviation(best_collapsed, 'Best Fit', v, calc='both', show=None, save=1)
+bestfit.plot_estat_target_deviation(best_collapsed, 'Best Fit', v, calc='both', report=report)
 
 # ENDSTUDY
 end_collapsed = endstudy.collapse_forms(endstudy.final_data)
-endstudy.plot_estat_target_deviation(end_collapsed, 'Final', v, calc='both', show=None, save=1)
+endstudy.plot_estat_target_deviation(end_collapsed, 'Final', v, calc='both', report=report)
+
+# Write the RMS/mean values shown on the deviation plots
+v.write_freq_profile(best_collapsed, 
+    './G23 REM Data/estat_bestfit_profile.csv', by=['form_factor'])
+v.write_freq_profile(end_collapsed, 
+    './G23 REM Data/estat_endstudy_profile.csv', by=['form_factor'])
 
 
 # Plot eSTAT BestFit - EndStudy
 combo = bestfit.compare_estat(bestfit.final_data, endstudy.final_data)
 combo_collapsed = bestfit.collapse_forms(combo)
-bestfit.plot_best_minus_end(data=combo_collapsed, verifit_model=v, calc='both', show=None, save=1)
+bestfit.plot_best_minus_end(data=combo_collapsed, verifit_model=v, calc='both', report=report)
+v.write_freq_profile(combo_collapsed, 
+    './G23 REM Data/estat_best-end_profile.csv', value_col='best-end', 
+    by=['form_factor'])
 
 
 # Plot NAL-NL2 target deviation
-#bestfit.plot_nal_target_deviation(bestfit, endstudy, v, calc='both', show=None, save=1)
+#bestfit.plot_nal_target_deviation(bestfit, endstudy, v, calc='both', report=report)
+
+report.close()
 
 
 ###############
@@ -7,60 +7,32 @@
 
     Written by: Travis Moore
     Created: 02/08/2023
-    Last edited: 02/08/2023
+    Last edited: 02/09/2023
 """
 
 ###########
 # Imports #
 ###########
-import numpy as np
-import pandas as pd
-import sklearn.metrics
 import matplotlib.pyplot as plt
 from matplotlib import rcParams
 rcParams.update({'figure.autolayout': True})
-from pathlib import Path
-import os
+
+# Import custom modules
+from models import reugmodel
 
 
 #################
 # Organize Data #
 #################
 # Average REUG
-AVG_REUG = [0, 2, 1, 3, 4, 7, 12, 15, 16, 17, 16, 15, 15, 14, 13, 12, 10, 7, 3, 3, 2, 2, 2, 2]
-
-# Get list of files
-_path = Path(r'\\starfile\Dept\Research and Development\HRT\Users\CR Studies\G23 Validation\REM Target Match')
-files = _path.glob('*.csv')
-files = list(files)
-
-# Create a list of dataframes with columns: filename, freq, reug_measured
-df_list = []
-for file in files:
-    df = pd.read_csv(file)
-    df = df[['Frequency', 'Real ear unaided gain']]
-
-    df.insert(loc=0, column='file_name', value=os.path.basename(file))
-    #df[['file_name', 'rem_device', 'side', 'ha_style']] = df['file_name'].str.split('_', expand=True)
-    #df = df[['file_name', 'rem_device', 'side', 'ha_style', 'Frequency', 'Real ear unaided gain']]
-    #df['ha_style'] = df.iloc[0, 3][:-4]
-    df.insert(loc=2, column='reug_avg', value=AVG_REUG)
-
-    df.rename(columns={
-        'Frequency': 'freq',
-        'Real ear unaided gain': 'reug_measured',
-        #'file_name': 'sub'
-        },
-        inplace=True
-    )
-
-    df_list.append(df)
-
-# Row-wise concatenation
-data = pd.concat(df_list, axis=0, ignore_index=False)
-freqs = data['freq'].unique()
-data.to_csv('REUG_Data.csv', index=False)
-print(data)
+AVG_REUG = reugmodel.AVG_REUG
+
+# Load all records as a records x freqs matrix
+_path = r'\\starfile\Dept\Research and Development\HRT\Users\CR Studies\G23 Validation\REM Target Match'
+r = reugmodel.REUGModel(_path, avg_reug=AVG_REUG)
+freqs = r.freqs
+r.write_csv('REUG_Data.csv')
+print(r.summary)
 
 
 #####################
@@ -98,28 +70,14 @@ axs.set(
 #############
 # Plot Data #
 #############
-# Plot individual difference
-diffs = pd.DataFrame()
-for record in data['file_name'].unique():
-    reug = data[data['file_name']==record]['reug_measured']
-    diff = reug - AVG_REUG
-    diffs[record] = diff
-    axs.plot(freqs, diff, lw=0.5)
+# Plot individual differences (one line per record)
+axs.plot(freqs, r.deviations.to_numpy().T, lw=0.5)
 
 # Plot grand average difference
-axs.plot(freqs, diffs.mean(axis=1), color='blue', lw=4, label="Mean Difference")
+axs.plot(freqs, r.summary['mean'], color='blue', lw=4, label="Mean Difference")
 
 # Plot RMSE
-rmse_list = []
-for f in freqs:
-    temp = data[data['freq'] == f]
-    mse = sklearn.metrics.mean_squared_error(
-        temp['reug_measured'], 
-        temp['reug_avg']
-    )
-    rmse = np.sqrt(mse)
-    rmse_list.append(rmse)
-axs.plot(freqs, rmse_list, 'ro', label="RMSE")
+axs.plot(freqs, r.summary['rmse'], 'ro', label="RMSE")
 plt.legend()
 
 # Add 0 line for reference
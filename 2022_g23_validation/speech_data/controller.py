@@ -10,12 +10,9 @@
 ###########
 # Import data science packages
 import pandas as pd
-import scipy.stats as stats
-
-# Import system packages
-import os
 
 # Import custom modules
+from models import comparisons
 from models import speechmodel
 
 
@@ -65,30 +62,6 @@ s = speechmodel.SpeechModel(_path)
 ##########################
 # Descriptive data funcs #
 ##########################
-def mismatch_scan():
-    # Inspect data for file name and content match
-    print('')
-    print('-' * 60)
-    print("controller: Looking for mismatches...")
-    booted = []
-    for idx, file in enumerate(s.files):
-        df = pd.read_csv(file)
-        specs = os.path.basename(file).split('_')[4:7]
-        specs = '_'.join(specs)
-
-        if not (df['Condition'] == specs).all():
-            print(f"controller: Mismatch in file {os.path.basename(file)}")
-            booted.append(idx)
-
-    print(f"controller: Total files before scan: {len(s.files)}")
-    print(f"controller: Total mismatches: {len(booted)}")
-    s.files = [i for j, i in enumerate(s.files) if j not in booted]
-    print(f"controller: Total files after scan: {len(s.files)}")
-
-    print("controller: Complete!")
-    print('-' * 60)
-    print('')
-
 def subject_count(data):
     print('')
     print('-' * 60)
@@ -129,6 +102,43 @@ def write_group_means():
     print("Complete!")
     print('-' * 60)
 
+def write_snr50(num_reversals=6):
+    print('')
+    print('-' * 60)
+    print("controller: Calculating SNR50 from adaptive tracks...")
+    s.get_snr50(num_reversals=num_reversals)
+    s.snr50_tracks.to_csv('./G23 Speech Data/snr50_tracks.csv')
+    s.snr50.to_csv('./G23 Speech Data/snr50.csv')
+    print(f"controller: {len(s.snr50_tracks)} tracks from {len(s.snr50)} groups")
+    print("controller: Complete!")
+    print('-' * 60)
+
+def write_psychometric_fits(data=None, outcome='sentence'):
+    print('')
+    print('-' * 60)
+    print("controller: Fitting psychometric functions...")
+    fits = s.fit_psychometric(data, outcome=outcome)
+    fits.to_csv(f'./G23 Speech Data/psychometric_fits_{outcome}.csv')
+    print(f"controller: Fit {fits['converged'].sum()} of {len(fits)} groups")
+    print("controller: Complete!")
+    print('-' * 60)
+
+
+##############
+# Data Store #
+##############
+def ingest_speech_data(db_path='./data/speech_trials.db'):
+    """ Parse new or changed files into the local trial store.
+        Load them with speechmodel.SpeechModel.from_store().
+    """
+    print('')
+    print('-' * 60)
+    print("controller: Updating trial store...")
+    num_files = speechmodel.SpeechModel(_path).ingest(db_path)
+    print(f"controller: Parsed {num_files} files")
+    print("controller: Complete!")
+    print('-' * 60)
+
 
 ##################
 # Plotting Funcs #
@@ -194,7 +204,6 @@ def wired_boxplots(data, show=None, save=None):
     print('')
     print('-' * 60)
     print("controller: Creating wired products plots...")
-    # Run through plots to find outliers
     for col in data_cols:
         for form in form_factors_wired:
             s.single_device_boxplot(data=data, form_factor=form, data_col=col, 
@@ -238,35 +247,24 @@ def multi_barplot():
 ##############
 # Statistics #
 ##############
-def compare_form_factor_pairs(data):
+def compare_form_factor_pairs(data, n_permutations=0, correction='holm'):
     print('')
     print('-'*60)
     print('controller: Comparing conditions across form factor pairs...')
-    data_dict = {}
-    for form in form_factors:
-        data_dict[form] = data.loc[(slice(None), slice(None), slice(None), [form])]
-
     pairs = [('RIC', 'MRIC'), ('ITC', 'ITE'), ('CIC', 'IIC')]
-    for pair in pairs: 
-        for env in ['q', 'n']:
-            temp = data_dict[pair[0]].loc[(slice(None), [env], slice(None), [pair[0]])]
-            conds = temp.index.get_level_values('condition').unique()
-            for cond in conds:
-                try:
-                    p1 = data_dict[pair[0]].loc[(slice(None), [env], [cond], [pair[0]])]
-                    p2 = data_dict[pair[1]].loc[(slice(None), [env], [cond], [pair[1]])]
-                except:
-                    print(f"No condition '{cond}' for {pair} in {env}")
-                    break
-
-                U1, p = stats.mannwhitneyu(p1, p2, alternative='two-sided')
-                print('-'*50)
-                print(f"{pair[0]} v. {pair[1]}: {cond} in {env}")
-                print('-'*50)
-                for ii, col in enumerate(p1.columns):
-                    print(f"'{col}' statistic: {U1[ii]}")
-                    print(f"p-value: {p[ii]}")
-                    print('')
+    results = comparisons.pairwise_tests(data, cols=data_cols,
+        by='form_factor', pairs=pairs, n_permutations=n_permutations,
+        correction=correction)
+
+    # Cells without both form factors are not tested
+    missing = results[(results['n1'] == 0) | (results['n2'] == 0)]
+    for row in missing.itertuples():
+        print(f"No condition '{row.condition}' for {(row.group1, row.group2)} in {row.environment}")
+    results = results.drop(missing.index)
+
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 160):
+        print(results)
+    results.to_csv('./G23 Speech Data/form_factor_comparisons.csv', index=False)
     print("controller: Complete!")
     print('-'*60)
     print('')
@@ -275,11 +273,13 @@ def compare_form_factor_pairs(data):
 ###########
 # Routine #
 ###########
-# Check for mismatches
-mismatch_scan()
+# Get df with clean files (skips files whose contents don't 
+# match their file names)
+s.organize_data(validate=True)
 
-# Get df with clean files
-s.organize_data()
+# Or load previously ingested trials (see ingest_speech_data)
+#ingest_speech_data()
+#s = speechmodel.SpeechModel.from_store('./data/speech_trials.db')
 
 # Get individual means
 s.get_ind_means()
@@ -288,10 +288,8 @@ print(f"Length of ind_means: {len(s.ind_means)}")
 # Write means to file
 s._to_wide_format(s.ind_means, title='wide_sub_means_all_data.csv')
 
-# Remove outliers
-wireless_boxplots(s.ind_means, show=None, save=None)
-wired_boxplots(s.ind_means, show=None, save=None)
-s.remove_outliers(s.ind_means, show=None, save=1)
+# Remove outliers (Tukey fences per environment/condition/form factor)
+s.remove_outliers(s.ind_means, cols=data_cols, method='tukey', show=None, save=1)
 print(f"Length of ind_means: {len(s.ind_means)}")
 print(f"Length of clean: {len(s.clean)}")
 
@@ -347,6 +345,8 @@ wired_boxplots_env(d, show=1, save=1)
 
 # # Descriptive outputs
 # write_sub_means(s.ind_means)
+# write_psychometric_fits()
+# write_snr50()
 #subject_count(s.collapsed)
 
 
@@ -0,0 +1,159 @@
+""" Adaptive-track SNR50 estimates for Speech Task Controller
+    snr50 data
+
+    Rebuilds each track (one file) from its trial rows, finds
+    the reversals of every track at once and estimates SNR50
+    as the mean level of the last N reversals. A psychometric
+    function fit to each track's trials (see psychometric.py)
+    gives a second estimate.
+
+    Assumes new_db_lvl (level) is the level of each trial.
+
+    Written by: Travis M. Moore
+    Created: Jan 30, 2023
+    Last edited: Jan 30, 2023
+"""
+
+###########
+# Imports #
+###########
+# Import data science packages
+import numpy as np
+import pandas as pd
+
+# Import custom modules
+from models import psychometric
+
+
+#############
+# Constants #
+#############
+# Group columns (matches SpeechModel.ind_means)
+GROUP_COLS = ['sub', 'environment', 'condition', 'form_factor']
+
+# Number of final reversals to average
+NUM_REVERSALS = 6
+
+
+#########
+# BEGIN #
+#########
+def track_arrays(trials, track_col='file', level_col='level'):
+    """ Pad each track's levels into a (tracks x trials) array.
+        Trials must be in presentation order within each track.
+
+        Returns:
+            tracks: Index of track labels
+            levels: Array of levels (NaN after a track ends)
+    """
+    grouped = trials.groupby(track_col, observed=True, sort=True)
+    codes = grouped.ngroup().to_numpy()
+    cols = trials.groupby(codes).cumcount().to_numpy()
+
+    tracks = grouped.size().index
+    levels = np.full((len(tracks), cols.max() + 1 if len(cols) else 0), np.nan)
+    levels[codes, cols] = trials[level_col].to_numpy(dtype=float)
+    return tracks, levels
+
+
+def find_reversals(levels):
+    """ Flag the trials where each track changes direction.
+
+        A reversal is the level at which an up run turns down
+        (or a down run turns up). Trials without a level change
+        keep the previous direction.
+
+        Parameters:
+            levels: (tracks x trials) array from track_arrays
+
+        Returns:
+            A boolean array the same shape as levels
+    """
+    steps = np.sign(np.diff(levels, axis=1))
+    steps[steps == 0] = np.nan
+    # Carry the last direction across trials with no change
+    direction = pd.DataFrame(steps).ffill(axis=1).to_numpy()
+
+    reversals = np.zeros(levels.shape, dtype=bool)
+    # The level before a change in direction is a turning point
+    reversals[:, 1:-1] = (direction[:, 1:] != direction[:, :-1]) & \
+        ~np.isnan(direction[:, :-1]) & ~np.isnan(steps[:, 1:])
+    return reversals
+
+
+def mean_last_reversals(levels, reversals, num_reversals=NUM_REVERSALS):
+    """ Mean level of the last num_reversals reversals of each
+        track. Tracks with fewer reversals use all of them.
+
+        Returns:
+            means: Array of means (NaN if no reversals)
+            counts: Number of reversals in each track
+    """
+    # Reversals at or after each trial, counted from the end
+    from_end = np.cumsum(reversals[:, ::-1], axis=1)[:, ::-1]
+    last = reversals & (from_end <= num_reversals)
+    counts = reversals.sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        means = np.where(last, levels, 0).sum(axis=1) / last.sum(axis=1)
+    return means, counts
+
+
+def analyze_tracks(trials, num_reversals=NUM_REVERSALS, fit=True, group_cols=GROUP_COLS, track_col='file', level_col='level', outcome='sentence'):
+    """ SNR50 estimates for every adaptive track.
+
+        Parameters:
+            trials: snr50 trial rows (e.g., SpeechModel.snr50_data)
+                in presentation order within each track
+            num_reversals: Number of final reversals to average
+            fit: Also fit a psychometric function to each track
+            outcome: Outcome used for the fit ('sentence' or
+                'words')
+
+        Returns:
+            A dataframe indexed by group_cols + [track_col] with
+            columns snr50_reversals, snr50_fit, n_reversals and
+            n_trials
+    """
+    tracks, levels = track_arrays(trials, track_col, level_col)
+    reversals = find_reversals(levels)
+    means, counts = mean_last_reversals(levels, reversals, num_reversals)
+
+    # One row of group labels per track
+    labels = trials.groupby(track_col, observed=True, sort=True)[group_cols].first()
+
+    result = labels.assign(
+        snr50_reversals=means,
+        n_reversals=counts,
+        n_trials=(~np.isnan(levels)).sum(axis=1)
+    )
+
+    if fit:
+        fits = psychometric.fit_groups(trials, group_cols=[track_col],
+            level_col=level_col, outcome=outcome)
+        result['snr50_fit'] = fits['snr50'].reindex(tracks).to_numpy()
+    else:
+        result['snr50_fit'] = np.nan
+
+    result.index = tracks
+    result = result.reset_index().set_index(group_cols + [track_col])
+    return result[['snr50_reversals', 'snr50_fit', 'n_reversals', 'n_trials']]
+
+
+def summarize(tracks, group_cols=GROUP_COLS):
+    """ Average track estimates within each group so the result
+        has the same index as SpeechModel.ind_means.
+
+        Returns:
+            A dataframe indexed by group_cols with the mean
+            snr50_reversals and snr50_fit, total reversals and
+            trials, and the number of tracks
+    """
+    grouped = tracks.groupby(level=group_cols, observed=True)
+    summary = grouped.agg({
+        'snr50_reversals': 'mean',
+        'snr50_fit': 'mean',
+        'n_reversals': 'sum',
+        'n_trials': 'sum'
+    })
+    summary['n_tracks'] = grouped.size()
+    return summary
@@ -0,0 +1,212 @@
+""" Pairwise nonparametric comparisons for speech data
+
+    Runs every pairwise Mann-Whitney U (independent groups) or
+    Wilcoxon signed-rank (paired by subject) test between the
+    levels of one factor (e.g., form factor), within each cell
+    of the other factors (e.g., environment x condition).
+    Optional permutation p-values are computed for all
+    permutations of a pair at once with numpy, and p-values
+    are corrected for multiple comparisons (Holm or FDR, via
+    statsmodels).
+
+    Written by: Travis M. Moore
+    Created: Feb 01, 2023
+    Last edited: Feb 01, 2023
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+# Import data science packages
+import numpy as np
+import pandas as pd
+from scipy import stats
+from statsmodels.stats.multitest import multipletests
+
+
+###########
+# Helpers #
+###########
+def _rank_sum_perm(x, y, n_permutations, seed):
+    """ Permutation p-value for the Mann-Whitney U statistic.
+        All permutations are ranked and summed in one step.
+    """
+    rng = np.random.default_rng(seed)
+    ranks = stats.rankdata(np.concatenate([x, y]))
+    n1 = len(x)
+    mean_u = n1 * len(y) / 2
+
+    # Each row is one relabeling of the pooled ranks
+    perms = rng.random((n_permutations, len(ranks))).argsort(axis=1)
+    u_perm = ranks[perms[:, :n1]].sum(axis=1) - n1 * (n1 + 1) / 2
+    u_obs = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+
+    extreme = np.abs(u_perm - mean_u) >= np.abs(u_obs - mean_u) - 1e-9
+    return (extreme.sum() + 1) / (n_permutations + 1)
+
+
+def _sign_flip_perm(x, y, n_permutations, seed):
+    """ Permutation p-value for the Wilcoxon signed-rank
+        statistic, flipping the sign of every difference at
+        random (all permutations at once).
+    """
+    rng = np.random.default_rng(seed)
+    diffs = x - y
+    diffs = diffs[diffs != 0]
+    ranks = stats.rankdata(np.abs(diffs)) * np.sign(diffs)
+
+    signs = rng.choice([-1, 1], size=(n_permutations, len(ranks)))
+    w_perm = (signs * np.abs(ranks)).sum(axis=1)
+    w_obs = ranks.sum()
+
+    extreme = np.abs(w_perm) >= np.abs(w_obs) - 1e-9
+    return (extreme.sum() + 1) / (n_permutations + 1)
+
+
+def _run_test(job):
+    """ Run one comparison. Runs in a worker process when
+        n_jobs > 1.
+
+        Parameters:
+            job: (x, y, paired, n_permutations, seed)
+
+        Returns:
+            statistic, effect size, p, p_perm
+    """
+    x, y, paired, n_permutations, seed = job
+    if (len(x) == 0) or (len(y) == 0):
+        return (np.nan,) * 4
+
+    if paired:
+        if np.all(x == y):
+            return (np.nan,) * 4
+        res = stats.wilcoxon(x, y)
+        # Matched-pairs rank-biserial correlation
+        diffs = x - y
+        diffs = diffs[diffs != 0]
+        ranks = stats.rankdata(np.abs(diffs))
+        effect = (ranks[diffs > 0].sum() - ranks[diffs < 0].sum()) / ranks.sum()
+        perm = _sign_flip_perm
+    else:
+        res = stats.mannwhitneyu(x, y, alternative='two-sided')
+        # Rank-biserial correlation
+        effect = 2 * res.statistic / (len(x) * len(y)) - 1
+        perm = _rank_sum_perm
+
+    p_perm = perm(x, y, n_permutations, seed) if n_permutations else np.nan
+    return res.statistic, effect, res.pvalue, p_perm
+
+
+def adjust_pvalues(pvals, method='holm'):
+    """ Correct p-values for multiple comparisons. NaN p-values
+        are ignored.
+
+        Parameters:
+            pvals: Array of p-values
+            method: 'holm' (family-wise error) or 'fdr'
+                (Benjamini-Hochberg false discovery rate)
+
+        Returns:
+            An array of adjusted p-values
+    """
+    methods = {'holm': 'holm', 'fdr': 'fdr_bh'}
+    if method not in methods:
+        raise ValueError(f"comparisons: Unknown correction: {method}")
+
+    pvals = np.asarray(pvals, dtype=float)
+    adjusted = np.full(pvals.shape, np.nan)
+    valid = ~np.isnan(pvals)
+    if valid.any():
+        adjusted[valid] = multipletests(pvals[valid], 
+            method=methods[method])[1]
+    return adjusted
+
+
+#########
+# BEGIN #
+#########
+def pairwise_tests(data, cols=('sentence_pc',), by='form_factor', pairs=None, within=('environment', 'condition'), paired=False, n_permutations=0, correction='holm', n_jobs=None, seed=None):
+    """ Compare every pair of `by` levels within each cell of
+        `within`, for each data column.
+
+        Parameters:
+            data: Table with a MultiIndex (e.g., SpeechModel.
+                ind_means) or columns for sub, by and within
+            cols: Data column(s) to test
+            by: Factor whose levels are compared
+            pairs: List of (level, level) to compare (default:
+                all combinations)
+            within: Factors that define each comparison cell
+            paired: Wilcoxon signed-rank test on subjects in
+                both groups (default: Mann-Whitney U)
+            n_permutations: Also compute permutation p-values
+                (0 to skip)
+            correction: 'holm', 'fdr' or None; applied across
+                all tests in the table
+            n_jobs: Number of processes for the tests
+            seed: Seed for the permutations
+
+        Returns:
+            A dataframe with one row per test
+    """
+    cols = [cols] if isinstance(cols, str) else list(cols)
+    within = [within] if isinstance(within, str) else list(within)
+    df = data.reset_index() if isinstance(data.index, pd.MultiIndex) else data.copy()
+    if pairs is None:
+        levels = pd.unique(df[by].astype(object))
+        pairs = list(combinations(sorted(levels), 2))
+
+    # Row positions of every (within..., by) group in one pass
+    indices = df.groupby(within + [by], observed=True).indices
+    cells = sorted({key[:-1] for key in indices}, key=str)
+
+    rows = []
+    jobs = []
+    seeds = np.random.SeedSequence(seed).spawn(
+        len(cols) * len(cells) * len(pairs))
+    for col in cols:
+        vals = df[col].to_numpy(dtype=float)
+        for cell in cells:
+            for first, second in pairs:
+                idx1 = indices.get(cell + (first,), np.array([], dtype=int))
+                idx2 = indices.get(cell + (second,), np.array([], dtype=int))
+                if paired:
+                    # Keep subjects measured in both groups, in order
+                    subs1 = pd.Series(idx1, index=df['sub'].to_numpy()[idx1])
+                    subs2 = pd.Series(idx2, index=df['sub'].to_numpy()[idx2])
+                    both = subs1.index.intersection(subs2.index)
+                    idx1, idx2 = subs1[both].to_numpy(), subs2[both].to_numpy()
+                x, y = vals[idx1], vals[idx2]
+                if paired:
+                    # Drop the whole pair if either value is missing
+                    keep = ~(np.isnan(x) | np.isnan(y))
+                    x, y = x[keep], y[keep]
+                else:
+                    x, y = x[~np.isnan(x)], y[~np.isnan(y)]
+                rows.append(dict(zip(within, cell), col=col,
+                    group1=first, group2=second, n1=len(x), n2=len(y)))
+                jobs.append((x, y, paired, n_permutations,
+                    seeds[len(jobs)]))
+
+    if n_jobs and n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(_run_test, jobs,
+                chunksize=max(1, len(jobs) // (4 * n_jobs))))
+    else:
+        results = [_run_test(job) for job in jobs]
+
+    table = pd.DataFrame(rows)
+    table[['statistic', 'effect', 'p', 'p_perm']] = np.array(results,
+        dtype=float).reshape(-1, 4)
+
+    table['p_adj'] = np.nan
+    table['p_perm_adj'] = np.nan
+    if correction:
+        table['p_adj'] = adjust_pvalues(table['p'], correction)
+        if n_permutations:
+            table['p_perm_adj'] = adjust_pvalues(table['p_perm'], correction)
+    return table
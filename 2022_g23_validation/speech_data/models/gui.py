@@ -0,0 +1,30 @@
+""" GUI and plotting helpers shared by the models
+
+    tkinter and matplotlib are imported on first use so that
+    runs with a path and no plots don't need a display.
+
+    Written by: Travis M. Moore
+    Created: Feb 06, 2023
+    Last edited: Feb 06, 2023
+"""
+
+#########
+# BEGIN #
+#########
+def ask_directory():
+    """ Show a folder picker and return the selected path
+    """
+    import tkinter as tk
+    from tkinter import filedialog
+    root = tk.Tk()
+    root.withdraw()
+    return filedialog.askdirectory()
+
+
+def pyplot():
+    """ Import the plotting stack the first time a plot is made.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib import rcParams
+    rcParams.update({'figure.autolayout': True})
+    return plt
@@ -0,0 +1,242 @@
+""" Batch psychometric function fitting for Speech Task
+    Controller data
+
+    Fits a logistic function with a lapse rate to the trial
+    outcomes of every group (e.g., subject x condition x form
+    factor) by maximum likelihood:
+
+        p(x) = (1 - lapse) / (1 + exp(-slope * (x - threshold)))
+
+    A coarse grid search is evaluated for all groups at once
+    with numpy; each group's best grid point is then refined
+    with L-BFGS-B (optionally in parallel processes).
+
+    Written by: Travis M. Moore
+    Created: Jan 27, 2023
+    Last edited: Jan 27, 2023
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+from concurrent.futures import ProcessPoolExecutor
+
+# Import data science packages
+import numpy as np
+import pandas as pd
+from scipy import optimize
+from scipy.special import expit
+
+
+#############
+# Constants #
+#############
+# Group columns for a fit
+GROUP_COLS = ['sub', 'environment', 'condition', 'form_factor']
+
+# Trial outcome columns: (column, trials per row, scale to
+# number correct)
+OUTCOMES = {
+    'sentence': ('sentence_pc', 1, 1),
+    'words': ('word_pc', 5, 5 / 100)
+}
+
+# Grid search: slopes (per dB) and lapse rates
+SLOPE_GRID = np.logspace(-2, 0.5, 25)
+LAPSE_GRID = np.array([0, 0.01, 0.02, 0.05, 0.1])
+NUM_THRESHOLDS = 41
+
+# Upper bound on the lapse rate
+MAX_LAPSE = 0.1
+
+# Groups per block of the grid search (limits memory)
+BLOCK_SIZE = 256
+
+
+###########
+# Helpers #
+###########
+def logistic(x, threshold, slope, lapse=0):
+    """ Proportion correct at level x
+    """
+    return (1 - lapse) * expit(slope * (x - threshold))
+
+
+def _log_likelihood(p, k, n):
+    """ Binomial log likelihood (without the constant term)
+        of k correct out of n at probability p. Works on any
+        broadcastable arrays; rows with n = 0 add nothing.
+    """
+    p = np.clip(p, 1e-9, 1 - 1e-9)
+    return k * np.log(p) + (n - k) * np.log(1 - p)
+
+
+def _neg_log_likelihood(params, x, k, n):
+    threshold, log_slope, lapse = params
+    p = logistic(x, threshold, np.exp(log_slope), lapse)
+    return -np.sum(_log_likelihood(p, k, n))
+
+
+def _refine(groups):
+    """ Refine grid-search estimates with L-BFGS-B. Runs in a
+        worker process when n_jobs > 1.
+
+        Parameters:
+            groups: List of (x, k, n, start) for each group
+
+        Returns:
+            A list of (threshold, slope, lapse, loglik, converged)
+    """
+    results = []
+    for x, k, n, start in groups:
+        span = x.max() - x.min()
+        bounds = [
+            (x.min() - 2 * span, x.max() + 2 * span),
+            (np.log(SLOPE_GRID[0]) - 2, np.log(SLOPE_GRID[-1]) + 2),
+            (0, MAX_LAPSE)
+        ]
+        start = (start[0], np.log(start[1]), start[2])
+        fit = optimize.minimize(_neg_log_likelihood, start, args=(x, k, n),
+            method='L-BFGS-B', bounds=bounds)
+        threshold, log_slope, lapse = fit.x
+        results.append((threshold, np.exp(log_slope), lapse, -fit.fun,
+            bool(fit.success)))
+    return results
+
+
+#########
+# BEGIN #
+#########
+def count_trials(trials, group_cols=GROUP_COLS, level_col='level', outcome='sentence'):
+    """ Number correct (k) and number of trials (n) at each level
+        of each group.
+
+        Parameters:
+            trials: Trial-level data (e.g., SpeechModel.data)
+            outcome: 'sentence' (correct/incorrect per trial) or
+                'words' (0-5 words correct per trial)
+
+        Returns:
+            A dataframe indexed by group_cols + [level_col]
+    """
+    col, per_trial, scale = OUTCOMES[outcome]
+    df = trials[group_cols + [level_col]].copy()
+    df['k'] = trials[col].astype(float) * scale
+    df['n'] = per_trial
+    return df.groupby(group_cols + [level_col], observed=True)[['k', 'n']].sum()
+
+
+def fit_groups(trials, group_cols=GROUP_COLS, level_col='level', outcome='sentence', refine=True, n_jobs=None):
+    """ Fit a psychometric function to each group.
+
+        Parameters:
+            trials: Trial-level data with a level column and
+                outcome columns (e.g., SpeechModel.data)
+            group_cols: Columns that define a group
+            level_col: Presentation level (dB) column
+            outcome: 'sentence' or 'words' (see count_trials)
+            refine: Refine grid-search estimates with L-BFGS-B
+            n_jobs: Number of processes for the refinement
+                (default: run in this process). On Windows,
+                scripts that use n_jobs > 1 need an
+                "if __name__ == '__main__':" guard.
+
+        Returns:
+            A dataframe indexed by group_cols with columns:
+                threshold: Midpoint of the function (dB)
+                snr50: Level at 50% correct (dB); differs from
+                    threshold when lapse > 0
+                slope: Logistic slope (per dB)
+                lapse: Lapse rate (upper asymptote is 1 - lapse)
+                loglik: Log likelihood of the fit
+                n_levels, n_trials: Data in the group
+                converged: Whether the L-BFGS-B refinement 
+                    converged (False if refine is False)
+            Groups tested at fewer than two levels are NaN.
+    """
+    counts = count_trials(trials, group_cols, level_col, outcome).reset_index()
+
+    # Pad groups into (groups x levels) arrays; padded cells
+    # have n = 0 and do not affect the likelihood
+    grouped = counts.groupby(group_cols, observed=True, sort=True)
+    codes = grouped.ngroup().to_numpy()
+    cols = counts.groupby(codes).cumcount().to_numpy()
+    num_groups = codes.max() + 1 if len(codes) else 0
+    num_levels = cols.max() + 1 if len(cols) else 0
+
+    x = np.zeros((num_groups, num_levels))
+    k = np.zeros((num_groups, num_levels))
+    n = np.zeros((num_groups, num_levels))
+    x[codes, cols] = counts[level_col].to_numpy(dtype=float)
+    k[codes, cols] = counts['k'].to_numpy()
+    n[codes, cols] = counts['n'].to_numpy()
+
+    levels = (n > 0).sum(axis=1)
+    xmin = np.where(n > 0, x, np.inf).min(axis=1, initial=np.inf)
+    xmax = np.where(n > 0, x, -np.inf).max(axis=1, initial=-np.inf)
+    fittable = levels >= 2
+
+    # Grid search over all groups at once
+    start = np.full((num_groups, 4), np.nan)
+    for first in range(0, num_groups, BLOCK_SIZE):
+        block = np.arange(first, min(first + BLOCK_SIZE, num_groups))
+        block = block[fittable[block]]
+        if not len(block):
+            continue
+        # Threshold grid spans each group's own levels
+        thresholds = np.linspace(xmin[block], xmax[block], NUM_THRESHOLDS).T
+        # Shape: (groups, thresholds, slopes, levels)
+        z = SLOPE_GRID[None, None, :, None] * (x[block, None, None, :] - thresholds[:, :, None, None])
+        best = np.full(len(block), -np.inf)
+        for lapse in LAPSE_GRID:
+            p = (1 - lapse) * expit(z)
+            ll = _log_likelihood(p, k[block, None, None, :], n[block, None, None, :]).sum(axis=-1)
+            flat = ll.reshape(len(block), -1)
+            idx = flat.argmax(axis=1)
+            vals = flat[np.arange(len(block)), idx]
+            better = vals > best
+            ti, si = np.unravel_index(idx, ll.shape[1:])
+            rows = block[better]
+            start[rows, 0] = thresholds[better, ti[better]]
+            start[rows, 1] = SLOPE_GRID[si[better]]
+            start[rows, 2] = lapse
+            start[rows, 3] = vals[better]
+            best = np.maximum(best, vals)
+
+    # Refine each group's best grid point
+    results = np.full((num_groups, 4), np.nan)
+    converged = np.zeros(num_groups, dtype=bool)
+    todo = np.flatnonzero(fittable)
+    if refine and len(todo):
+        jobs = [(x[g][n[g] > 0], k[g][n[g] > 0], n[g][n[g] > 0], start[g, :3])
+            for g in todo]
+        if n_jobs and n_jobs > 1:
+            chunks = np.array_split(np.arange(len(jobs)), n_jobs)
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                fits = pool.map(_refine, [[jobs[i] for i in chunk] for chunk in chunks])
+                fits = [fit for chunk in fits for fit in chunk]
+        else:
+            fits = _refine(jobs)
+        for g, fit in zip(todo, fits):
+            results[g] = fit[:4]
+            converged[g] = fit[4]
+    else:
+        results[todo] = start[todo]
+
+    threshold, slope, lapse, loglik = results.T
+    # 50% point: (1 - lapse) * expit(slope * (x - threshold)) = 0.5
+    with np.errstate(divide='ignore', invalid='ignore'):
+        snr50 = threshold - np.log(1 - 2 * lapse) / slope
+
+    index = grouped.size().index
+    return pd.DataFrame({
+        'threshold': threshold,
+        'snr50': snr50,
+        'slope': slope,
+        'lapse': lapse,
+        'loglik': loglik,
+        'n_levels': levels,
+        'n_trials': n.sum(axis=1) / OUTCOMES[outcome][1],
+        'converged': converged
+        }, index=index)
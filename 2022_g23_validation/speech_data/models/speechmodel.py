@@ -4,16 +4,12 @@
 
     Written by: Travis M. Moore
     Created: Dec 06, 2022
-    Last edited: Dec 23, 2022
+    Last edited: Jan 25, 2023
 """
 
 ###########
 # Imports #
 ###########
-# Import GUI packages
-import tkinter as tk
-from tkinter import filedialog
-
 # Import system packages
 import os
 from pathlib import Path
@@ -22,34 +18,182 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
-import matplotlib.pyplot as plt
-from matplotlib import rcParams
-rcParams.update({'figure.autolayout': True})
+# Import custom modules
+from models import adaptive
+from models import gui
+from models import psychometric
+from models import tables
+from models import trialstore
+
+# GUI and plotting packages are imported on first use
+# (see gui.py) for headless runs
+
+
+###########
+# Helpers #
+###########
+def _lookup(table, *keys):
+    """ Look up each row's keys in a relabel table in a single
+        reindex. Keys missing from the table return NaN.
+    """
+    keys = [np.asarray(key, dtype=object) for key in keys]
+    if len(keys) == 1:
+        index = pd.Index(keys[0])
+    else:
+        index = pd.MultiIndex.from_arrays(keys)
+    return pd.Series(table).reindex(index).to_numpy()
+
+
+def _file_labels(files):
+    """ Label each file by its name, or by its full path if 
+        two of the files share a name (e.g., the same file name
+        in different folders)
+    """
+    names = [os.path.basename(file) for file in files]
+    if len(set(names)) < len(names):
+        return [str(file) for file in files]
+    return names
+
+
+##################
+# Relabel Tables #
+##################
+# Collapse form factors into device groups
+FORM_FACTOR_GROUPS = {
+    'RIC': 'RIC',
+    'MRIC': 'RIC',
+    'ITC': 'Custom',
+    'ITE': 'Custom',
+    'CIC': 'Wired',
+    'IIC': 'Wired'
+}
+
+# Display labels for collapsed form factors
+FORM_FACTOR_LABELS = {
+    'Wired': 'Wired Custom',
+    'Custom': 'Wireless Custom'
+}
+
+# Display labels for each (condition, environment)
+CONDITION_LABELS = {
+    ('aided', 'q'): 'Aided',
+    ('aided', 'n'): 'NR On + Dir',
+    ('unaided', 'q'): 'Unaided',
+    ('unaided', 'n'): 'Unaided',
+    ('omnioff', 'q'): 'NR Off + Omni',
+    ('omnioff', 'n'): 'NR Off + Omni',
+    ('omnion', 'q'): 'NR On + Omni',
+    ('omnion', 'n'): 'NR On + Omni',
+    ('embs', 'q'): 'EM - Best Sound',
+    ('embs', 'n'): 'Edge Mode',
+    ('emes', 'q'): 'EM - Enhanced Speech',
+    ('emes', 'n'): 'Edge Mode'
+}
+
+# Wired devices have no directional mics
+WIRED_CONDITION_LABELS = {
+    ('aided', 'n'): 'NR On + Omni'
+}
 
 
 #########
 # BEGIN #
 #########
 class SpeechModel:
-    def __init__(self, path=None):
+    # Speech Task Controller columns used, and their new names
+    COLUMNS = {
+        'Subject': 'sub',
+        'Condition': 'condition_code',
+        'new_db_lvl': 'level',
+        'Num Words Correct': 'word_pc',
+        'Outcome': 'sentence_pc'
+    }
+
+    # Index levels that define a group of subjects
+    GROUP_LEVELS = ['environment', 'condition', 'form_factor']
+
+    def __init__(self, path=None, compact=True):
         """ Import all data files as single dataframe
+
+            Parameters:
+                path: Path to directory of Speech Task Controller 
+                    .csv files
+                compact: Store identifier columns as categoricals 
+                    and scores/levels as float32 (set to False to 
+                    keep object/float64 columns)
         """
+        self.compact = compact
+
         if not path:
             # Show file dialog to get path
-            root = tk.Tk()
-            root.withdraw()
-            path = filedialog.askdirectory()
+            path = gui.ask_directory()
             print(f"Path of selected folder: {path}")
 
         # Get list of file paths
         files = Path(path).glob('*.csv')
         self.files = list(files)
 
-        # List for catching outliers in func: get_outliers()
-        # Putting it here so it doesn't reset when plot funcs
-        # are called multiple times
+        # Index of rows flagged by remove_outliers()
         self.outliers = []
 
+        # Set by organize_data(); also clears cached results
+        self.data = None
+
+
+    @classmethod
+    def from_store(cls, db_path=trialstore.DB_PATH, compact=True, **filters):
+        """ Load trials from a trial store (see ingest) instead 
+            of reading .csv files. Replaces organize_data.
+
+            Parameters:
+                db_path: Path to the SQLite trial store
+                compact: See __init__
+                filters: Values (or lists of values) of sub, 
+                    environment, condition or form_factor to 
+                    load, e.g., form_factor=['RIC', 'MRIC']
+        """
+        print('')
+        print('-' * 60)
+        print("speechmodel: Loading data from trial store...")
+        model = cls.__new__(cls)
+        model.compact = compact
+        model.outliers = []
+        model.mismatches = []
+        model.data = None
+
+        with trialstore.TrialStore(db_path) as store:
+            trials = store.query(**filters)
+        # Trials are labeled by file path; relabel them like
+        # _parse_trials
+        model.files = [Path(path) for path in trials['file'].cat.categories]
+        trials['file'] = trials['file'].cat.rename_categories(
+            _file_labels(model.files))
+        model._finalize(trials)
+
+        print(f"speechmodel: Loaded {len(trials)} trials from {len(model.files)} files")
+        print("speechmodel: Complete!")
+        print('-' * 60)
+        print('')
+        return model
+
+
+    @property
+    def data(self):
+        """ Trial-level data from organize_data(). Setting it
+            clears the cached individual means, descriptives and
+            group arrays.
+        """
+        return self._data
+
+
+    @data.setter
+    def data(self, df):
+        self._data = df
+        self._ind_means = None
+        self._descriptives = {}
+        # Group arrays of the last table used (see group_arrays())
+        self._group_cache = None
+
 
     ###########################
     # Data Organization Funcs #
@@ -58,64 +202,199 @@ class SpeechModel:
         return (num / 5) * 100
 
 
-    def organize_data(self):
-        """ Prepare data for use
+    def _parse_subjects(self, subs):
+        """ Convert subject IDs like 'P1234' (or 1234) to ints.
+            IDs that can't be parsed are printed and left as-is.
         """
-        print('')
-        print('-' * 60)
-        print("speechmodel: Organizing data...")
-        #print(f"Number of files: {len(self.files)}")
-        df = pd.concat((pd.read_csv(f) for f in self.files), 
-            ignore_index=True)
-
-        df[['environment', 'condition', 'form_factor']] = df['Condition'].str.split('_', expand=True)
-        df = df[['Subject', 'environment', 'condition', 'form_factor', 'new_db_lvl', 'Num Words Correct', 'Outcome']]
-        df.rename(columns={
-            'Subject': 'sub', 
-            'new_db_lvl': 'level', 
-            'Num Words Correct': 'word_pc',
-            'Outcome': 'sentence_pc'},
-            inplace=True)
+        ids = subs.astype(str).str.extract(r'^[A-Za-z]?(\d+)(?:\.0+)?$', 
+            expand=False)
+        ids = pd.to_numeric(ids)
+        bad = ids.isna() & subs.notna()
+        if bad.any():
+            for sub in subs[bad].unique():
+                print(f"Subject: {sub}; First char: {str(sub)[0]}")
+            return ids.astype('Int64').astype(object).where(~bad, subs)
+        return ids
+
+
+    def _read_file(self, file):
+        """ Read a single Speech Task Controller file. 
+
+            Returns:
+                The dataframe, or None if the Condition column 
+                doesn't match the file name (e.g., 
+                P2001_2022_12_06_n_aided_ITC_7.csv -> n_aided_ITC)
+        """
+        df = pd.read_csv(file, usecols=self.COLUMNS)
+        specs = '_'.join(os.path.basename(file).split('_')[4:7])
+        if not (df['Condition'] == specs).all():
+            return None
+        return df
 
-        # Convert number of words to percent
-        df['word_pc'] = df['word_pc'].apply(self.words_to_percent)
-
-        # Remove 'P' from subject IDs and convert to int
-        sub_list = list(df['sub'])
-        for ii, sub in enumerate(sub_list):
-            if isinstance(sub, str):
-                try:
-                    sub_list[ii] = int(sub[1:])
-                except:
-                    print(f"Subject: {sub}; First char: {sub[0]}")
-        df['sub'] = sub_list
+
+    def _read_files(self, validate=True):
+        """ Read each file in self.files once.
+
+            Parameters:
+                validate: Skip files whose Condition column doesn't 
+                    match the file name. Skipped files are listed 
+                    in self.mismatches.
+
+            Returns:
+                A list of dataframes; self.files is updated to 
+                the files that were kept
+        """
+        df_list = []
+        kept = []
+        self.mismatches = []
+        for file in self.files:
+            if validate:
+                df = self._read_file(file)
+            else:
+                df = pd.read_csv(file, usecols=self.COLUMNS)
+
+            if df is None:
+                print(f"speechmodel: Mismatch in file {os.path.basename(file)}")
+                self.mismatches.append(os.path.basename(file))
+            else:
+                df_list.append(df)
+                kept.append(file)
+
+        if validate:
+            print(f"speechmodel: Total files before scan: {len(self.files)}")
+            print(f"speechmodel: Total mismatches: {len(self.mismatches)}")
+            print(f"speechmodel: Total files after scan: {len(kept)}")
+        self.files = kept
+        return df_list
+
+
+    def _parse_trials(self, df_list):
+        """ Combine files from _read_files into one trial table.
+
+            Returns:
+                A dataframe with columns sub, environment, 
+                condition, form_factor, level, word_pc, 
+                sentence_pc, file (source file name; see 
+                _file_labels) and trial 
+                (trial number within the file)
+        """
+        df = pd.concat(df_list, ignore_index=True)
+        df.rename(columns=self.COLUMNS, inplace=True)
+
+        # Split each unique condition once (not once per row)
+        # and look up the parts by category code
+        cond = df.pop('condition_code').astype('category')
+        parts = pd.Series(cond.cat.categories).str.split('_', expand=True)
+        parts.columns = ['environment', 'condition', 'form_factor']
 
         # Make all form factors uppercase
-        df['form_factor'] = df['form_factor'].str.upper()
+        parts['form_factor'] = parts['form_factor'].str.upper()
 
         # Change 'aidednroff' to 'omnioff'
-        bools = df['condition']=='aidednroff'
-        df.loc[bools,'condition'] = 'omnioff'
+        parts['condition'] = parts['condition'].replace('aidednroff', 'omnioff')
 
-        # Drop SNR50
-        bools = df['condition'] == 'snr50'
-        df = df[~bools]
+        # Expand back to one row per trial (missing conditions 
+        # have code -1, which reindexes to NaN)
+        parts = parts.reindex(cond.cat.codes.to_numpy())
+        df[parts.columns] = parts.to_numpy()
+        df = df[['sub', 'environment', 'condition', 'form_factor', 'level', 
+            'word_pc', 'sentence_pc']]
+
+        # Convert number of words to percent
+        df['word_pc'] = self.words_to_percent(df['word_pc'])
+
+        # Remove prefix (e.g., 'P') from subject IDs and convert to int
+        df['sub'] = self._parse_subjects(df['sub'])
+
+        # Source file and trial number of each row (used for 
+        # snr50 tracks)
+        file_codes = np.repeat(np.arange(len(df_list)), [len(x) for x in df_list])
+        df['file'] = pd.Categorical.from_codes(file_codes, 
+            _file_labels(self.files))
+        df['trial'] = df.groupby('file', observed=True).cumcount()
+        return df
+
+
+    def _finalize(self, trials):
+        """ Set self.data and self.snr50_data from a trial table 
+            (from _parse_trials or a TrialStore query)
+        """
+        df = trials
 
         # Drop subject P2050
         sub_bools = df['sub'] == 2050
         df = df[~sub_bools]
 
+        # Keep SNR50 (adaptive track) trials separately, with the
+        # trial number within each file
+        bools = df['condition'] == 'snr50'
+        snr50 = df[bools].copy()
+        snr50['file'] = snr50['file'].cat.remove_unused_categories()
+        snr50['trial'] = snr50.groupby('file', observed=True).cumcount()
+        df = df[~bools].drop(columns=['file', 'trial'])
+
         # Get list of all conditions
         self.conditions = df['condition'].unique()
         self.conditions.sort()
 
+        if self.compact:
+            df = tables.compact(df)
+            snr50 = tables.compact(snr50)
+
         self.data = df.copy()
+        self.snr50_data = snr50
+
+
+    def organize_data(self, validate=True):
+        """ Prepare data for use. Each file is read once.
+
+            Parameters:
+                validate: Skip files whose Condition column doesn't 
+                    match the file name. Skipped files are listed 
+                    in self.mismatches.
+        """
+        print('')
+        print('-' * 60)
+        print("speechmodel: Organizing data...")
+        #print(f"Number of files: {len(self.files)}")
+        self._finalize(self._parse_trials(self._read_files(validate)))
 
         print("speechmodel: Complete!")
         print('-' * 60)
         print('')
 
 
+    def ingest(self, db_path=trialstore.DB_PATH, validate=True):
+        """ Add new or changed files in self.files to a trial 
+            store (see trialstore.py). Files already in the 
+            store are not read.
+
+            Returns:
+                The number of files parsed
+        """
+        print('')
+        print('-' * 60)
+        print("speechmodel: Ingesting data...")
+        with trialstore.TrialStore(db_path) as store:
+            pending = store.pending(self.files)
+            print(f"speechmodel: New or changed files: {len(pending)}")
+            self.files = pending
+            self.mismatches = []
+            if pending:
+                df_list = self._read_files(validate)
+                trials = self._parse_trials(df_list) if df_list else None
+                mismatches = [file for file in pending 
+                    if file not in self.files]
+                store.add(trials, self.files, mismatches)
+            num_files = len(store.files)
+
+        print(f"speechmodel: Total files in store: {num_files}")
+        print("speechmodel: Complete!")
+        print('-' * 60)
+        print('')
+        return len(pending)
+
+
     def _to_wide_format(self, data, title=None):
         df = data.copy()
         df.reset_index(inplace=True)
@@ -127,120 +406,165 @@ class SpeechModel:
 
         if not title:
             title = 'wide_format.csv'    
-        df.to_csv('./G23 Speech Data/' + title, index=False)
+        tables.write_table(df, './G23 Speech Data/' + title)
 
 
     def get_ind_means(self):
-        # Group by sub/env/cond and get individual means
-        self.ind_means = self.data.groupby(['sub', 'environment', 'condition', 'form_factor']).mean()
-        # Convert percent from decimal
-        self.ind_means.loc[:, 'sentence_pc'] = np.round(self.ind_means.loc[:, 'sentence_pc'] * 100, 2)
+        # Group by sub/env/cond and get individual means 
+        # (computed once per self.data)
+        if self._ind_means is None:
+            ind_means = self.data.groupby(['sub', 'environment', 'condition', 'form_factor'], observed=True).mean()
+            # Convert percent from decimal
+            ind_means.loc[:, 'sentence_pc'] = np.round(ind_means.loc[:, 'sentence_pc'] * 100, 2)
+            self._ind_means = ind_means
+        self.ind_means = self._ind_means
+
+
+    def get_descriptives(self, ddof=0):
+        """ Descriptive statistics of the individual means for 
+            each environment/condition/form factor group. 
+            Computed once per self.data and ddof.
+
+            Parameters:
+                ddof: Delta degrees of freedom for sd and sem. 
+                    The default (0) gives the population SD, 
+                    which matches the np.std group SDs used so 
+                    far; use 1 for the sample SD.
+
+            Returns:
+                A dataframe with (stat, data column) columns for
+                mean, sd, sem, median, q1, q3, iqr and n
+        """
+        if ddof not in self._descriptives:
+            self.get_ind_means()
+            grouped = self.ind_means.groupby(self.GROUP_LEVELS, observed=True)
+            q1 = grouped.quantile(0.25)
+            q3 = grouped.quantile(0.75)
+            self._descriptives[ddof] = pd.concat({
+                'mean': grouped.mean(),
+                'sd': grouped.std(ddof=ddof),
+                'sem': grouped.sem(ddof=ddof),
+                'median': grouped.median(),
+                'q1': q1,
+                'q3': q3,
+                'iqr': q3 - q1,
+                'n': grouped.count()
+                }, axis=1)
+        self.descriptives = self._descriptives[ddof]
+        return self.descriptives
 
 
     def get_group_means(self):
-        self.get_ind_means()
-        self.group_means = self.ind_means.groupby(['environment', 'condition', 'form_factor']).mean()
-        self.group_sds = self.ind_means.groupby(['environment', 'condition', 'form_factor']).apply(np.std)
-
-
-    def find_outliers(self, df, boxdata, conds):
-        self.boxdata = boxdata
-               
-        # Get outliers per condition
-        fliers = []
-        for ii, item in enumerate(self.boxdata['fliers']):
-            vals = item.get_data()[1]
-            fliers.append(vals)
-
-        # Get index of outlier values
-        for ii in range(0, len(conds)):
-            #print(f"{conds[ii]}: {fliers[ii]}")
-            for outlier in fliers[ii]:
-                #print(f"Outlier: {outlier}")
-                bools = df.index.get_level_values('condition')==conds[ii]
-                temp = df[bools]
-                #print(temp)
-                idx = np.where(temp==outlier)[0]
-                #print(idx)
-                
-                # Multiple subjects with the same outlier value
-                # must be separated manually and appended to 
-                # outlier list
-                # if len(idx) > 1:
-                #     for val in idx:
-                #         sub='MULTIPLE'
-                #         print(f"Duplicate outlier data type: {type(temp.index[idx])}")
-                #         self.outliers.append(temp.index[val])
-                #         #self.outliers.append(list(temp.index[val]))
-                #         print(temp.index[val])
-                # else:
-                #     sub = temp.index[idx][0]
-                #     print(f"Typical outlier data type: {type(temp.index[idx])}")
-                #     self.outliers.append(temp.index[idx])
-                #     #self.outliers.append(list(temp.index[idx]))
-                #     print(temp.index[idx])
-
-
-                sub = temp.index[idx][0]
-                #print(f"Typical outlier data type: {type(temp.index[idx])}")
-                self.outliers.append(temp.index[idx])
-                #self.outliers.append(list(temp.index[idx]))
-                #print(temp.index[idx])
-
-                #print(f"Value of {outlier} is an outlier for subject {sub} at index {idx}")
-
-        #print(self.outliers)
-        #self.outliers.to_csv('./G23 Speech Data/outliers.csv')
-
-
-    def remove_outliers(self, df, show=None, save=None):
-        self.clean = df.copy()
+        desc = self.get_descriptives(ddof=0)
+        self.group_means = desc['mean']
+        self.group_sds = desc['sd']
+
 
+    def get_snr50(self, num_reversals=adaptive.NUM_REVERSALS, fit=True, outcome='sentence'):
+        """ SNR50 for each snr50 adaptive track (self.snr50_tracks)
+            and per subject/environment/form factor (self.snr50, 
+            indexed like self.ind_means). See adaptive.py.
+
+            Parameters:
+                num_reversals: Number of final reversals to average
+                fit: Also estimate SNR50 from a psychometric fit
+                outcome: Outcome used for the fit
+        """
+        self.snr50_tracks = adaptive.analyze_tracks(self.snr50_data, 
+            num_reversals=num_reversals, fit=fit, outcome=outcome)
+        self.snr50 = adaptive.summarize(self.snr50_tracks)
+        return self.snr50
+
+
+    def fit_psychometric(self, data=None, outcome='sentence', n_jobs=None):
+        """ Fit a logistic psychometric function (threshold/SNR50,
+            slope, lapse) for each subject/environment/condition/
+            form factor. See psychometric.fit_groups.
+
+            Parameters:
+                data: Trial-level data (default: self.data). Only
+                    groups tested at two or more levels are fit.
+                outcome: 'sentence' or 'words'
+                n_jobs: Number of processes for the fits
+        """
+        if data is None:
+            data = self.data
+        self.psychometric = psychometric.fit_groups(data, outcome=outcome, 
+            n_jobs=n_jobs)
+        return self.psychometric
+
+
+    def detect_outliers(self, df, cols=('sentence_pc',), method='tukey', k=None):
+        """ Flag outliers within each environment/condition/form 
+            factor group. No figure is drawn.
+
+            Parameters:
+                df: Data with a MultiIndex that includes 
+                    environment, condition and form_factor
+                    (e.g., self.ind_means)
+                cols: Data column(s) to check
+                method: 'tukey' (outside the k * IQR fences; the
+                    same points drawn as boxplot fliers) or 'mad'
+                    (more than k scaled median absolute deviations
+                    from the median)
+                k: Fence multiplier (default: 1.5 for 'tukey'; 
+                    3 for 'mad')
+
+            Returns:
+                A boolean series (True = outlier in any of cols).
+                Outlier rows and their fences are stored in
+                self.outlier_table.
+        """
+        cols = [cols] if isinstance(cols, str) else list(cols)
+        grouped = df[cols].groupby(level=self.GROUP_LEVELS, observed=True)
+
+        if method == 'tukey':
+            k = 1.5 if k is None else k
+            q1 = grouped.transform('quantile', 0.25)
+            q3 = grouped.transform('quantile', 0.75)
+            lower = q1 - k * (q3 - q1)
+            upper = q3 + k * (q3 - q1)
+        elif method == 'mad':
+            k = 3 if k is None else k
+            median = grouped.transform('median')
+            mad = (df[cols] - median).abs().groupby(
+                level=self.GROUP_LEVELS, observed=True).transform('median')
+            # Scale MAD to match the SD of normal data
+            lower = median - k * 1.4826 * mad
+            upper = median + k * 1.4826 * mad
+        else:
+            raise ValueError(f"speechmodel: Unknown outlier method: {method}")
+
+        mask = ((df[cols] < lower) | (df[cols] > upper)).any(axis=1)
+
+        self.outlier_table = pd.concat([df[cols], 
+            lower.add_suffix('_lower'), upper.add_suffix('_upper')], 
+            axis=1)[mask]
+        return mask
+
+
+    def remove_outliers(self, df, cols=('sentence_pc',), method='tukey', k=None, show=None, save=None):
+        """ Drop outliers (see detect_outliers) from df and store
+            the result in self.clean
+        """
         print('')
         print('-'*60)
         print('speechmodel: Removing outliers...\n')
 
-        # # Remove duplicates from outlier list
-        # # Occurrs from calling the plotting function multiple times
-        # res = []
-        # [res.append(x) for x in self.outliers if x not in res]
-        # self.outliers = res
-
-        # # Drop outlier rows
-        # for outlier_row in self.outliers:
-        #     self.clean.drop(outlier_row, inplace=True)
-        # #return df.drop(self.outliers)
-        # print(f"speechmodel: Cleaned df length: {len(self.clean)}")
-
-        # Drop outlier rows
-        dups = []
-        for outlier in self.outliers:
-            try:
-                self.clean.drop(outlier, inplace=True)
-            except:
-                dups.append(list(outlier))
-                #print("Duplicate outlier found!")
-                print(list(outlier))
-                #pass
-
-        #print("")
-        print(f"\nspeechmodel: Number of outliers found: {len(self.outliers)}")
-        print(f"speechmodel: Number of duplicate outliers found: {len(dups)}")
-        print(f"speechmodel: Unique outliers: {len(self.outliers) - len(dups)}")
+        mask = self.detect_outliers(df, cols=cols, method=method, k=k)
+        self.outliers = list(df.index[mask])
+        self.clean = df[~mask].copy()
+
+        print(f"speechmodel: Number of outliers found: {len(self.outliers)}")
         print(f"speechmodel: Length of uncleaned data: {len(df)}")
         print(f"speechmodel: Cleaned df length: {len(self.clean)}")
-        print("speechmodel: NOTE: the difference between the clean and " +
-            "raw data lengths may differ slightly due to multiple " +
-            "outliers in a single list element.")
 
         # Print to console
         if show:
-            for ii in range(0, len(self.outliers)):
-                print(list(self.outliers[ii]))
+            print(self.outlier_table)
 
         if save:
-            #self.clean.to_csv('./G23 Speech Data/clean_sub_means.csv')
-            pd.DataFrame(self.outliers).to_csv('./G23 Speech Data/outliers.csv')
+            self.outlier_table.to_csv('./G23 Speech Data/outliers.csv')
 
         print('speechmodel: Complete!')
         print('-'*60)
@@ -251,80 +575,123 @@ class SpeechModel:
         # Make copy of provided dataframe
         self.collapsed = data.copy()
 
-        # Get current form factor index values
+        # Look up the collapsed form factor for each row
         current_index_vals = self.collapsed.index.get_level_values('form_factor')
-        
-        # Create list of new index vals
-        new_index_vals = []
-        for val in current_index_vals:
-            if val == 'RIC':
-                new_index_vals.append('RIC')
-            elif val == 'MRIC':
-                new_index_vals.append('RIC')
-            elif val == 'ITC':
-                new_index_vals.append('Custom')
-            elif val == 'ITE':
-                new_index_vals.append('Custom')
-            elif val == 'CIC':
-                new_index_vals.append('Wired')
-            elif val == 'IIC':
-                new_index_vals.append('Wired')
-            else: 
-                print('Invalid form factor!!')
-                return
+        new_index_vals = _lookup(FORM_FACTOR_GROUPS, current_index_vals)
+        if pd.isna(new_index_vals).any():
+            print('Invalid form factor!!')
+            return
 
         # Replace old index vals with new index vals
         # Drop original form factor index column
         self.collapsed.index = self.collapsed.index.droplevel(3)
         # Add new form factors values as index
         self.collapsed = self.collapsed.assign(form_factor=new_index_vals).set_index('form_factor', append=True).copy()
-        #self.collapsed.drop('level', axis=1, inplace=True)
-        #temp = self.collapsed.copy()
-        #temp.reset_index(inplace=True)
-        self.collapsed.to_csv('./G23 Speech Data/collapsed_speech_data.csv')
+        tables.write_table(self.collapsed, 
+            './G23 Speech Data/collapsed_speech_data.csv', index=True)
 
 
     def final_plot_format(self, data):
+        """ Replace form factor and condition codes with display 
+            labels (see FORM_FACTOR_LABELS and CONDITION_LABELS)
+        """
         d = data.copy()
         d.reset_index(inplace=True)
 
-        for ii in range(0, len(d)):
-            # Form factors
-            if d.iloc[ii, 3] == 'Wired':
-                d.iloc[ii, 3] = 'Wired Custom'
-            elif d.iloc[ii, 3] == 'Custom':
-                d.iloc[ii, 3] = 'Wireless Custom'
-
-            # Conditions
-            if (d.iloc[ii, 2] == 'aided') and (d.iloc[ii, 1]=='n') and (d.iloc[ii, 3] != 'Wired Custom'):
-                d.iloc[ii, 2] = 'NR On + Dir'
-            elif (d.iloc[ii, 2] == 'aided') and (d.iloc[ii, 1]=='n') and (d.iloc[ii, 3] == 'Wired Custom'):
-                d.iloc[ii, 2] = 'NR On + Omni'
-            elif (d.iloc[ii, 2] == 'aided') and (d.iloc[ii, 1]=='q'):
-                d.iloc[ii, 2] = 'Aided'
-            elif d.iloc[ii, 2] == 'unaided':
-                d.iloc[ii, 2] = 'Unaided'
-            elif d.iloc[ii, 2] == 'omnioff':
-                d.iloc[ii, 2] = 'NR Off + Omni'
-            elif d.iloc[ii, 2] == 'omnion':
-                d.iloc[ii, 2] = 'NR On + Omni'
-            elif (d.iloc[ii, 2] == 'embs') and (d.iloc[ii, 1]=='n'):
-                d.iloc[ii, 2] = 'Edge Mode'
-            elif (d.iloc[ii, 2] == 'embs') and (d.iloc[ii, 1]=='q'):
-                d.iloc[ii, 2] = 'EM - Best Sound'
-            elif (d.iloc[ii, 2] == 'emes') and (d.iloc[ii, 1]=='n'):
-                d.iloc[ii, 2] = 'Edge Mode'
-            elif (d.iloc[ii, 2] == 'emes') and (d.iloc[ii, 1]=='q'):
-                d.iloc[ii, 2] = 'EM - Enhanced Speech'
- 
+        # Form factors
+        forms = _lookup(FORM_FACTOR_LABELS, d['form_factor'])
+        forms = np.where(pd.isna(forms), d['form_factor'].astype(object), forms)
+
+        # Conditions (aided in noise is omni for wired devices)
+        conds = _lookup(CONDITION_LABELS, d['condition'], d['environment'])
+        wired = _lookup(WIRED_CONDITION_LABELS, d['condition'], d['environment'])
+        conds = np.where((forms == 'Wired Custom') & pd.notna(wired), wired, conds)
+        conds = np.where(pd.isna(conds), d['condition'].astype(object), conds)
+
+        d['form_factor'] = forms
+        d['condition'] = conds
+        d['environment'] = d['environment'].astype(object)
         d.set_index(['sub', 'environment', 'condition', 'form_factor'], inplace=True)
         return d
 
 
+    ################
+    # Group Arrays #
+    ################
+    def group_arrays(self, data, data_col):
+        """ Split data_col into one array per (environment, 
+            form_factor, condition) group. The arrays for the 
+            last table and column are kept and reused by the 
+            plotting functions. Make a new table (rather than 
+            editing data in place) to refresh them.
+
+            Returns:
+                values: dict of {(env, form_factor, cond): array}
+                subs: dict of {(env, form_factor, cond): array 
+                    of subject IDs}
+        """
+        cached = self._group_cache
+        if cached and (cached[0] is data) and (cached[1] == data_col):
+            return cached[2]
+
+        grouped = data.groupby(level=['environment', 'form_factor', 'condition'], 
+            observed=True)
+        vals = data[data_col].to_numpy()
+        sub_ids = data.index.get_level_values('sub').to_numpy()
+        values = {group: vals[idx] for group, idx in grouped.indices.items()}
+        subs = {group: sub_ids[idx] for group, idx in grouped.indices.items()}
+
+        # Keep only one table alive
+        self._group_cache = (data, data_col, (values, subs))
+        return values, subs
+
+
+    def _condition_order(self, conds, xlabs=None):
+        """ Order conditions for plotting: xlabs order, then any
+            conditions missing from xlabs in their original order
+            (same as pd.Categorical(conds, xlabs).argsort())
+        """
+        if xlabs is None:
+            return list(conds)
+        return [c for c in xlabs if c in conds] + \
+            [c for c in conds if c not in xlabs]
+
+
+    def _env_groups(self, data, data_col, env, form_factor, xlabs=None):
+        """ Arrays for each condition of one environment and 
+            form factor, in plotting order.
+
+            Returns:
+                conds, list of value arrays, number of subjects
+
+            Raises:
+                KeyError if there is no data for env/form_factor
+        """
+        values, subs = self.group_arrays(data, data_col)
+        conds = [cond for (e, form, cond) in values 
+            if (e == env) and (form == form_factor)]
+        if not conds:
+            raise KeyError((env, form_factor))
+
+        conds = self._condition_order(conds, xlabs)
+        arrays = [values[(env, form_factor, cond)] for cond in conds]
+        n = len(np.unique(np.concatenate(
+            [subs[(env, form_factor, cond)] for cond in conds])))
+        return conds, arrays, n
+
+
     ##################
     # Plotting Funcs #
     ##################
-    def multi_barplot(self, form_factors, show=None, save=None):
+    def multi_barplot(self, form_factors, show=None, save=None, fill=1):
+        """ Bar plot of group mean sentence scores for every 
+            condition and form factor, quiet and noise.
+
+            Parameters:
+                form_factors: Form factors to plot (one bar each)
+                fill: Placeholder height for groups with no data
+        """
+        plt = gui.pyplot()
         colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', 
             '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
 
@@ -334,70 +701,31 @@ class SpeechModel:
         X = np.arange(len(self.conditions))
         X = X * 3
 
-        # Create dict of data by form factor
-        self.form_dict = {}
-        for form in form_factors:
-            # Subset data by specified form factor
-            bools = self.ind_means.index.get_level_values('form_factor') == form
-            # Get GROUP mean outcome values
-            temp = self.ind_means[bools].groupby(['environment', 'condition']).mean()
-            self.form_dict[form] = temp
+        # GROUP means on the full environment x condition x form 
+        # factor grid; missing groups are NaN
+        envs = ['q', 'n']
+        grid = pd.MultiIndex.from_product([envs, self.conditions, form_factors],
+            names=self.GROUP_LEVELS)
+        self.bar_means = self.ind_means.groupby(self.GROUP_LEVELS, 
+            observed=True).mean().reindex(grid)
+
+        # Shape: (environment, condition, form factor)
+        means = self.bar_means['sentence_pc'].to_numpy().reshape(
+            len(envs), len(self.conditions), len(form_factors))
+        heights = np.where(np.isnan(means), fill, means)
 
         # Multi-barplot
         plt.style.use('seaborn-v0_8')
         fig, axs = plt.subplots(nrows=2, ncols=1)
         fig.suptitle(f"Word Recognition Scores for All Form Factors")
-        
-        # QUIET data
-        self.data_dict = {}
-        for ii, form in enumerate(form_factors):
-            quiet = self.form_dict[form].loc['q']
-            quiet.reset_index(inplace=True)
-            missing = list(set(self.conditions) - set(quiet['condition']))
-            if missing:
-                for miss in missing:
-                    quiet.loc[len(quiet.index)] = [miss, 1, 1, 1]
-            quiet.sort_values(by=['condition'], inplace=True)
-
-            self.data_dict[form] = quiet
-
-        offset = 0.4
-        for form in (form_factors):
-            print(f"\nQuiet: {form}")
-            print(self.data_dict[form])
-            axs[0].bar(X+offset, self.data_dict[form]['sentence_pc'], width=0.4)
-            axs[0].set_title('Quiet')
-            offset = offset + 0.4
-
-        # NOISE data
-        for ii, form in enumerate(form_factors):
-            try:
-                noise = self.form_dict[form].loc['n']
-                noise.reset_index(inplace=True)
-            except KeyError:
-                    missing_dict = {
-                        'condition': ['aided', 'emes', 'embs', 'omnioff', 'omnion', 'unaided'],
-                        'level': np.repeat(1,6),
-                        'words_correct': np.repeat(1,6),
-                        'sentence_pc': np.repeat(1,6)
-                    }
-                    noise = pd.DataFrame(missing_dict)
-
-            missing = list(set(self.conditions) - set(noise['condition']))
-            if missing:
-                for miss in missing:
-                    noise.loc[len(noise.index)] = [miss, 1, 1, 1]
-            noise.sort_values(by=['condition'], inplace=True)
-
-            self.data_dict[form] = noise
-
-        offset = 0.4
-        for form in (form_factors):
-            print(f"\nNoise: {form}")
-            print(self.data_dict[form])
-            axs[1].bar(X+offset, self.data_dict[form]['sentence_pc'], width=0.4)
-            axs[1].set_title('Noise')
-            offset = offset + 0.4
+
+        for ii, title in enumerate(['Quiet', 'Noise']):
+            print(f"\n{title}:")
+            print(pd.DataFrame(means[ii], index=self.conditions, 
+                columns=form_factors))
+            for jj in range(len(form_factors)):
+                axs[ii].bar(X + 0.4 * (jj + 1), heights[ii, :, jj], width=0.4)
+            axs[ii].set_title(title)
 
         # Axis info for both plots
         for ii in [0, 1]:
@@ -422,6 +750,7 @@ class SpeechModel:
     def single_env_boxplot(self, data, form_factor, env, data_col, show=None, save=None, **kwargs):
         """ Make boxplots for a single form factor, all conditions.
         """
+        plt = gui.pyplot()
         # Set up figure
         plt.style.use('seaborn-v0_8')
         
@@ -439,24 +768,14 @@ class SpeechModel:
         #########
         if env == 'q':
             try:
-                # Custom sort group means
-                quiet_means = data.loc[(slice(None), ['q'], slice(None), [form_factor]), [data_col]]
-                quiet_xlabs = kwargs.get('quiet_xlabs', quiet_means.index.get_level_values('condition'))
-                quiet_means = quiet_means.iloc[pd.Categorical(quiet_means.index.get_level_values('condition'), quiet_xlabs).argsort()]
-                
-                fig.suptitle(f"Word Recognition Scores for {form_factor} Group (n$\u2248${len(quiet_means.index.get_level_values('sub').unique())})")
-
-                # Put data into list for boxplot with matplotlib (_)
-                conds = list(quiet_means.index.get_level_values('condition').unique())
-                quiet = []
-                for cond in conds:
-                    x = quiet_means.loc[(slice(None), slice(None), [cond], slice(None))][data_col]
-                    quiet.append(x)
+                # Values for each condition in plotting order
+                conds, quiet, n = self._env_groups(data, data_col, 'q', 
+                    form_factor, kwargs.get('quiet_xlabs'))
 
-                # Plot data
-                qboxdata = axs.boxplot(quiet, labels=conds)
+                fig.suptitle(f"Word Recognition Scores for {form_factor} Group (n$\u2248${n})")
 
-                self.find_outliers(quiet_means, qboxdata, conds)
+                # Plot data
+                axs.boxplot(quiet, labels=conds)
 
                 #axs.set(title=f"Quiet ({data_col})", ylabel="Percent Correct", ylim=(-5,105))
                 axs.set(title="Quiet", ylabel="Percent Correct", ylim=(-5,105))
@@ -470,25 +789,14 @@ class SpeechModel:
         #########
         if env == 'n':
             try:
-                # Custom sort
-                noise_means = data.loc[(slice(None), ['n'], slice(None), [form_factor]), [data_col]]
-                noise_xlabs = kwargs.get('noise_xlabs', noise_means.index.get_level_values('condition'))
-                noise_means = noise_means.iloc[pd.Categorical(noise_means.index.get_level_values('condition'), noise_xlabs).argsort()]
-                #print(f"\nIndividual Means:\n{noise_means}")
-
-                fig.suptitle(f"Word Recognition Scores for {form_factor} Group (n$\u2248${len(noise_means.index.get_level_values('sub').unique())})")
+                # Values for each condition in plotting order
+                conds, noise, n = self._env_groups(data, data_col, 'n', 
+                    form_factor, kwargs.get('noise_xlabs'))
 
-                # Put data into list for boxplot with matplotlib (_)
-                conds = list(noise_means.index.get_level_values('condition').unique())
-                noise = []
-                for cond in conds:
-                    x = noise_means.loc[(slice(None), slice(None), [cond], slice(None))][data_col]
-                    noise.append(x)
+                fig.suptitle(f"Word Recognition Scores for {form_factor} Group (n$\u2248${n})")
 
                 # Plot data
-                nboxdata = axs.boxplot(noise, labels=conds)
-
-                self.find_outliers(noise_means, nboxdata, conds)
+                axs.boxplot(noise, labels=conds)
 
                 #axs.set(title=f"Noise ({data_col})", ylim=(-5, 105),
                 axs.set(title=f"Noise", ylim=(-5, 105),
@@ -514,6 +822,7 @@ class SpeechModel:
         """ Make barplot with error bars for a single form factor, 
             all conditions.
         """
+        plt = gui.pyplot()
 
         # Set up figure
         plt.style.use('seaborn-v0_8')
@@ -524,22 +833,12 @@ class SpeechModel:
         # QUIET #
         #########
         try:
-            # Custom sort group means
-            quiet_means = data.loc[(slice(None), ['q'], slice(None), [form_factor]), [data_col]]
-            quiet_xlabs = kwargs.get('quiet_xlabs', quiet_means.index.get_level_values('condition'))
-            quiet_means = quiet_means.iloc[pd.Categorical(quiet_means.index.get_level_values('condition'), quiet_xlabs).argsort()]
-            
-            # Put data into list for boxplot with matplotlib (_)
-            conds = list(quiet_means.index.get_level_values('condition').unique())
-            quiet = []
-            for cond in conds:
-                x = quiet_means.loc[(slice(None), slice(None), [cond], slice(None))][data_col]
-                quiet.append(x)
+            # Values for each condition in plotting order
+            conds, quiet, _ = self._env_groups(data, data_col, 'q', 
+                form_factor, kwargs.get('quiet_xlabs'))
 
             # Plot data
-            qboxdata = axs[0].boxplot(quiet, labels=conds)
-
-            self.find_outliers(quiet_means, qboxdata, conds)
+            axs[0].boxplot(quiet, labels=conds)
 
             axs[0].set(title=f"{form_factor}: Quiet", ylabel="Percent Correct", ylim=(-5,105))
         except KeyError:
@@ -550,23 +849,12 @@ class SpeechModel:
         # NOISE #
         #########
         try:
-            # Custom sort
-            noise_means = data.loc[(slice(None), ['n'], slice(None), [form_factor]), [data_col]]
-            noise_xlabs = kwargs.get('noise_xlabs', noise_means.index.get_level_values('condition'))
-            noise_means = noise_means.iloc[pd.Categorical(noise_means.index.get_level_values('condition'), noise_xlabs).argsort()]
-            #print(f"\nIndividual Means:\n{noise_means}")
-
-            # Put data into list for boxplot with matplotlib (_)
-            conds = list(noise_means.index.get_level_values('condition').unique())
-            noise = []
-            for cond in conds:
-                x = noise_means.loc[(slice(None), slice(None), [cond], slice(None))][data_col]
-                noise.append(x)
+            # Values for each condition in plotting order
+            conds, noise, _ = self._env_groups(data, data_col, 'n', 
+                form_factor, kwargs.get('noise_xlabs'))
 
             # Plot data
-            nboxdata = axs[1].boxplot(noise, labels=conds)
-
-            self.find_outliers(noise_means, nboxdata, conds)
+            axs[1].boxplot(noise, labels=conds)
 
             axs[1].set(title=f"{form_factor}: Noise", ylim=(-5, 105),
                 ylabel="Percent Correct", xlabel="Condition")
@@ -589,8 +877,9 @@ class SpeechModel:
         """ Make barplot with error bars for a single form factor, 
             all conditions.
         """
+        plt = gui.pyplot()
         # Get data
-        self.get_group_means()
+        desc = self.get_descriptives()
         
         # Set up figure
         plt.style.use('seaborn-v0_8')
@@ -601,24 +890,24 @@ class SpeechModel:
         # QUIET #
         #########
         try:
-            # Custom sort group means
-            quiet_means = self.group_means.loc[(['q'], slice(None), [form_factor]), [data_col]]
-            quiet_sds = self.group_sds.loc[(['q'], slice(None), [form_factor]), [data_col]]
-            quiet_xlabs = kwargs.get('quiet_xlabs', quiet_means.index.get_level_values('condition'))
-            quiet_means = quiet_means.iloc[pd.Categorical(quiet_means.index.get_level_values('condition'), quiet_xlabs).argsort()]
-            quiet_sds = quiet_sds.iloc[pd.Categorical(quiet_sds.index.get_level_values('condition'), quiet_xlabs).argsort()]
+            # Group mean and SD for each condition in plotting order
+            conds, _, _ = self._env_groups(self.ind_means, data_col, 
+                'q', form_factor, kwargs.get('quiet_xlabs'))
+            rows = [('q', cond, form_factor) for cond in conds]
+            quiet_means = pd.DataFrame({
+                data_col: desc.loc[rows, ('mean', data_col)].to_numpy(),
+                'sd': desc.loc[rows, ('sd', data_col)].to_numpy()
+                }, index=pd.Index(conds, name='condition'))
             print(f"Group Means:\n{quiet_means}")
-            print(f"Group SD:\n{quiet_sds}")
 
             # Plot data
-            axs[0].bar(quiet_means.index.get_level_values('condition'), 
-                quiet_means[data_col])
+            axs[0].bar(conds, quiet_means[data_col])
             axs[0].set(title="Quiet", ylim=(0,115), ylabel="Percent Correct")
             # Plot error bars
             axs[0].errorbar(
-                quiet_means.index.get_level_values('condition'), 
+                conds, 
                 quiet_means[data_col],
-                yerr=quiet_sds[data_col],
+                yerr=quiet_means['sd'],
                 fmt='o',
                 color='k'
             )
@@ -630,25 +919,25 @@ class SpeechModel:
         # NOISE #
         #########
         try:
-            # Custom sort
-            noise_means = self.group_means.loc[(['n'], slice(None), [form_factor]), [data_col]]
-            noise_sds = self.group_sds.loc[(['n'], slice(None), [form_factor]), [data_col]]
-            noise_xlabs = kwargs.get('noise_xlabs', noise_means.index.get_level_values('condition'))
-            noise_means = noise_means.iloc[pd.Categorical(noise_means.index.get_level_values('condition'), noise_xlabs).argsort()]
-            noise_sds = noise_sds.iloc[pd.Categorical(noise_sds.index.get_level_values('condition'), noise_xlabs).argsort()]
+            # Group mean and SD for each condition in plotting order
+            conds, _, _ = self._env_groups(self.ind_means, data_col, 
+                'n', form_factor, kwargs.get('noise_xlabs'))
+            rows = [('n', cond, form_factor) for cond in conds]
+            noise_means = pd.DataFrame({
+                data_col: desc.loc[rows, ('mean', data_col)].to_numpy(),
+                'sd': desc.loc[rows, ('sd', data_col)].to_numpy()
+                }, index=pd.Index(conds, name='condition'))
             print(f"Group Means:\n{noise_means}")
-            print(f"Group SD:\n{noise_sds}")
 
             # Plot data
-            axs[1].bar(noise_means.index.get_level_values('condition'), 
-                noise_means[data_col])
+            axs[1].bar(conds, noise_means[data_col])
             axs[1].set(title="Noise", ylim=(0,115), 
                 ylabel="Percent Correct", xlabel="Condition")
             # Plot error bars
             axs[1].errorbar(
-                noise_means.index.get_level_values('condition'), 
+                conds, 
                 noise_means[data_col],
-                yerr=noise_sds[data_col],
+                yerr=noise_means['sd'],
                 fmt='o',
                 color='k'
             )
@@ -666,12 +955,13 @@ class SpeechModel:
         
 
     def single_barplot_OLD(self, form_factor, show=None, save=None, **kwargs):
+        plt = gui.pyplot()
         # Get INDIVIDUAL mean outcome values
         self.get_ind_means()
         # Subset data by specified form factor
         bools = self.ind_means.index.get_level_values('form_factor') == form_factor
         # Get GROUP mean outcome values
-        self.form = self.ind_means[bools].groupby(['environment', 'condition']).mean()
+        self.form = self.ind_means[bools].groupby(['environment', 'condition'], observed=True).mean()
 
         # Get quiet environment values
         try:
@@ -0,0 +1,217 @@
+""" Local SQLite store of Speech Task Controller trials
+
+    Trial rows are parsed once (see SpeechModel.ingest) and
+    kept in a single indexed table, so later runs can query a
+    subset by subject, environment, condition and form factor
+    without rereading the .csv files. The files table records
+    the path, modification time and size of every file that
+    has been loaded; only new or changed files are parsed.
+
+    Written by: Travis M. Moore
+    Created: Feb 03, 2023
+    Last edited: Feb 03, 2023
+"""
+
+###########
+# Imports #
+###########
+# Import system packages
+import os
+import sqlite3
+from pathlib import Path
+
+# Import data science packages
+import numpy as np
+import pandas as pd
+
+
+#############
+# Constants #
+#############
+# Default database location
+DB_PATH = './data/speech_trials.db'
+
+# Trial data columns (as in SpeechModel._parse_trials)
+DATA_COLUMNS = ['sub', 'environment', 'condition', 'form_factor', 'level',
+    'word_pc', 'sentence_pc']
+
+# Columns that can be used to select trials
+FILTER_COLUMNS = ['sub', 'environment', 'condition', 'form_factor']
+
+# Numeric columns have no declared type so values keep the
+# type they were parsed with (e.g., integer outcomes)
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (
+        file_id INTEGER PRIMARY KEY,
+        path TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        mtime REAL NOT NULL,
+        size INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        num_trials INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS trials (
+        file_id INTEGER NOT NULL REFERENCES files (file_id),
+        trial INTEGER NOT NULL,
+        sub,
+        environment TEXT,
+        condition TEXT,
+        form_factor TEXT,
+        level,
+        word_pc,
+        sentence_pc
+    );
+    CREATE INDEX IF NOT EXISTS trials_group
+        ON trials (sub, environment, condition, form_factor);
+    CREATE INDEX IF NOT EXISTS trials_file
+        ON trials (file_id, trial);
+"""
+
+
+###########
+# Helpers #
+###########
+def _file_key(file):
+    """ Absolute path, modification time and size of a file
+    """
+    stat = os.stat(file)
+    return str(Path(file).resolve()), stat.st_mtime, stat.st_size
+
+
+#########
+# BEGIN #
+#########
+class TrialStore:
+    def __init__(self, db_path=DB_PATH):
+        """ Open (or create) a trial database
+
+            Parameters:
+                db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self.con = sqlite3.connect(db_path)
+        self.con.executescript(SCHEMA)
+
+
+    def close(self):
+        self.con.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    @property
+    def files(self):
+        """ Table of loaded files
+        """
+        return pd.read_sql_query('SELECT * FROM files ORDER BY file_id',
+            self.con, index_col='file_id')
+
+
+    def pending(self, files):
+        """ Files that are new, or have changed since they were
+            loaded
+        """
+        known = {path: (mtime, size) for path, mtime, size
+            in self.con.execute('SELECT path, mtime, size FROM files')}
+        pending = []
+        for file in files:
+            path, mtime, size = _file_key(file)
+            if known.get(path) != (mtime, size):
+                pending.append(file)
+        return pending
+
+
+    def add(self, trials, files, mismatches=()):
+        """ Store parsed trials, replacing any earlier rows from
+            the same files
+
+            Parameters:
+                trials: Trial table from SpeechModel._parse_trials;
+                    the categories of its file column are in the 
+                    same order as files
+                files: Paths of the files in trials
+                mismatches: Paths of files that were skipped;
+                    recorded so they aren't parsed again
+        """
+        # Files are matched to trials by position, not by name, 
+        # so files with the same name in different folders are
+        # kept apart
+        if trials is not None:
+            codes = trials['file'].cat.codes.to_numpy()
+            counts = np.bincount(codes, minlength=len(files))
+        else:
+            counts = np.zeros(len(files), dtype=int)
+        counts = list(counts) + [0] * len(mismatches)
+
+        with self.con:
+            file_ids = []
+            for ii, (file, status) in enumerate(
+                    [(f, 'loaded') for f in files] + 
+                    [(f, 'mismatch') for f in mismatches]):
+                path, mtime, size = _file_key(file)
+                name = os.path.basename(file)
+                self.con.execute('DELETE FROM trials WHERE file_id IN '
+                    '(SELECT file_id FROM files WHERE path = ?)', (path,))
+                self.con.execute('DELETE FROM files WHERE path = ?', (path,))
+                cursor = self.con.execute('INSERT INTO files (path, name, '
+                    'mtime, size, status, num_trials) VALUES (?, ?, ?, ?, ?, ?)',
+                    (path, name, mtime, size, status, int(counts[ii])))
+                file_ids.append(cursor.lastrowid)
+
+            if trials is None or not len(trials):
+                return
+            cols = DATA_COLUMNS + ['trial']
+            rows = trials[cols].astype(object)
+            rows.insert(0, 'file_id', np.asarray(file_ids)[codes].tolist())
+            rows = rows.where(rows.notna(), None)
+            self.con.executemany('INSERT INTO trials (file_id, ' +
+                ', '.join(cols) + ') VALUES (' +
+                ', '.join('?' * (len(cols) + 1)) + ')',
+                rows.itertuples(index=False, name=None))
+
+
+    def query(self, **filters):
+        """ Select trials, in file and trial order
+
+            Parameters:
+                filters: Values (or lists of values) to keep for
+                    any of sub, environment, condition and
+                    form_factor, e.g., query(environment='n',
+                    form_factor=['RIC', 'MRIC'])
+
+            Returns:
+                A dataframe with one row per trial and the same
+                columns as SpeechModel._parse_trials. The file 
+                column holds the full path of each source file.
+        """
+        clauses = []
+        params = []
+        for col, values in filters.items():
+            if col not in FILTER_COLUMNS:
+                raise ValueError(f"trialstore: Can't filter on '{col}'")
+            if pd.api.types.is_scalar(values):
+                values = [values]
+            # sqlite3 can't bind numpy scalars (e.g., np.int64)
+            values = [value.item() if isinstance(value, np.generic) 
+                else value for value in values]
+            clauses.append(f"t.{col} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+
+        sql = 'SELECT ' + ', '.join(f"t.{col}" for col in DATA_COLUMNS) + \
+            ', f.path AS file, t.trial' + \
+            ' FROM trials t JOIN files f ON f.file_id = t.file_id'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY t.file_id, t.trial'
+        df = pd.read_sql_query(sql, self.con, params=params)
+
+        # Files as categories, in load order
+        paths = pd.unique(df['file'])
+        df['file'] = pd.Categorical(df['file'], categories=paths)
+        return df
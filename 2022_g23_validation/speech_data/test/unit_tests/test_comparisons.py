@@ -0,0 +1,71 @@
+""" Unit tests for comparisons. """
+
+###########
+# Imports #
+###########
+# Testing
+import pytest
+
+# System
+import sys
+from pathlib import Path
+
+# Data science
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Custom
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from models import comparisons
+
+
+############
+# Fixtures #
+############
+@pytest.fixture
+def ind_means():
+    """ Six subjects tested unaided and aided in quiet """
+    subs = np.arange(2001, 2007)
+    index = pd.MultiIndex.from_product([subs, ['q'], ['unaided', 'aided'],
+        ['RIC']], names=['sub', 'environment', 'condition', 'form_factor'])
+    scores = np.column_stack([[40, 50, 35, 60, 45, 55],
+        [70, 65, 60, 90, 50, 85]]).ravel()
+    return pd.DataFrame({'sentence_pc': scores.astype(float)}, index=index)
+
+
+##############
+# Unit Tests #
+##############
+def test_adjust_pvalues():
+    pvals = [0.01, 0.04, np.nan, 0.03]
+    np.testing.assert_allclose(comparisons.adjust_pvalues(pvals, 'holm'),
+        [0.03, 0.06, np.nan, 0.06])
+    np.testing.assert_allclose(comparisons.adjust_pvalues(pvals, 'fdr'),
+        [0.03, 0.04, np.nan, 0.04])
+    assert np.isnan(comparisons.adjust_pvalues([np.nan])).all()
+    with pytest.raises(ValueError):
+        comparisons.adjust_pvalues(pvals, 'bonferroni')
+
+
+def test_paired_drops_pairs_with_missing_values(ind_means):
+    ind_means.loc[(2003, 'q', 'aided', 'RIC'), 'sentence_pc'] = np.nan
+    table = comparisons.pairwise_tests(ind_means, by='condition',
+        within=('environment', 'form_factor'), paired=True)
+
+    row = table.iloc[0]
+    assert (row['group1'], row['group2']) == ('aided', 'unaided')
+    assert row['n1'] == row['n2'] == 5
+
+    # Subject 2003 is dropped from both groups
+    aided = [70, 65, 90, 50, 85]
+    unaided = [40, 50, 60, 45, 55]
+    assert row['p'] == pytest.approx(stats.wilcoxon(aided, unaided).pvalue)
+    assert row['effect'] == pytest.approx(1)
+
+
+def test_independent_keeps_other_values(ind_means):
+    ind_means.loc[(2003, 'q', 'aided', 'RIC'), 'sentence_pc'] = np.nan
+    table = comparisons.pairwise_tests(ind_means, by='condition',
+        within=('environment', 'form_factor'))
+    assert table[['n1', 'n2']].iloc[0].tolist() == [5, 6]
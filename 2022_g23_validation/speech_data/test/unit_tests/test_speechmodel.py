@@ -0,0 +1,85 @@
+""" Unit tests for speechmodel. """
+
+###########
+# Imports #
+###########
+# Testing
+import pytest
+
+# System
+import sys
+from pathlib import Path
+
+# Data science
+import numpy as np
+import pandas as pd
+
+# Custom
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from models import speechmodel
+
+
+############
+# Fixtures #
+############
+@pytest.fixture
+def model(tmp_path):
+    return speechmodel.SpeechModel(tmp_path)
+
+
+@pytest.fixture
+def ind_means():
+    index = pd.MultiIndex.from_tuples([
+        (2001, 'q', 'aided', 'RIC'),
+        (2001, 'q', 'unaided', 'RIC'),
+        (2002, 'q', 'aided', 'RIC'),
+        (2002, 'n', 'aided', 'ITE')
+        ], names=['sub', 'environment', 'condition', 'form_factor'])
+    return pd.DataFrame({'sentence_pc': [50.0, 40.0, 60.0, 70.0]}, index=index)
+
+
+##############
+# Unit Tests #
+##############
+# Plotting orders from controller.py
+XLABS = [
+    ['unaided', 'aided', 'embs', 'emes'],
+    ['unaided', 'omnioff', 'omnion', 'aided', 'embs'],
+    ['unaided', 'aided'],
+    ['unaided', 'omnioff', 'omnion']
+]
+
+CONDS = [
+    ['aided', 'embs', 'emes', 'omnioff', 'omnion', 'unaided'],
+    ['emes', 'unaided', 'aided', 'omnion'],
+    ['omnioff', 'unaided']
+]
+
+
+@pytest.mark.parametrize('xlabs', XLABS)
+@pytest.mark.parametrize('conds', CONDS)
+def test_condition_order_matches_categorical_argsort(model, conds, xlabs):
+    expected = list(np.asarray(conds)[pd.Categorical(conds, xlabs).argsort()])
+    assert model._condition_order(conds, xlabs) == expected
+
+
+def test_condition_order_missing_conditions_last(model):
+    conds = ['aided', 'embs', 'emes', 'omnioff', 'omnion', 'unaided']
+    xlabs = ['unaided', 'omnioff', 'omnion', 'aided', 'embs']
+    assert model._condition_order(conds, xlabs) == \
+        ['unaided', 'omnioff', 'omnion', 'aided', 'embs', 'emes']
+
+
+def test_condition_order_without_xlabs(model):
+    assert model._condition_order(['b', 'a']) == ['b', 'a']
+
+
+def test_group_arrays_keeps_one_table(model, ind_means):
+    values, subs = model.group_arrays(ind_means, 'sentence_pc')
+    np.testing.assert_array_equal(values[('q', 'RIC', 'aided')], [50, 60])
+    np.testing.assert_array_equal(subs[('q', 'RIC', 'aided')], [2001, 2002])
+    assert model.group_arrays(ind_means, 'sentence_pc')[0] is values
+
+    other = ind_means.copy()
+    model.group_arrays(other, 'sentence_pc')
+    assert model._group_cache[0] is other
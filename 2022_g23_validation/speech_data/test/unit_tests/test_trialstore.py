@@ -0,0 +1,85 @@
+""" Unit tests for trialstore. """
+
+###########
+# Imports #
+###########
+# Testing
+import pytest
+
+# System
+import sys
+from pathlib import Path
+
+# Data science
+import numpy as np
+import pandas as pd
+
+# Custom
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from models import speechmodel
+from models import trialstore
+
+
+############
+# Fixtures #
+############
+def _write_file(folder, name, sub, outcomes):
+    """ Write a minimal Speech Task Controller file """
+    folder.mkdir(exist_ok=True)
+    condition = '_'.join(name.split('_')[4:7])
+    pd.DataFrame({
+        'Subject': f"P{sub}",
+        'Condition': condition,
+        'new_db_lvl': 65,
+        'Num Words Correct': 5,
+        'Outcome': outcomes
+    }).to_csv(folder / name, index=False)
+
+
+@pytest.fixture
+def folders(tmp_path):
+    # The same file name in two folders
+    name = 'P2001_2022_12_06_n_aided_RIC_7.csv'
+    _write_file(tmp_path / 'a', name, 2001, [100, 0])
+    _write_file(tmp_path / 'b', name, 2001, [0, 0, 0])
+    _write_file(tmp_path / 'b', 'P2002_2022_12_06_n_aided_RIC_7.csv',
+        2002, [100])
+    return tmp_path
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'trials.db')
+
+
+##############
+# Unit Tests #
+##############
+def test_same_file_name_in_two_folders(folders, db_path):
+    for folder in ['a', 'b']:
+        speechmodel.SpeechModel(folders / folder).ingest(db_path)
+
+    with trialstore.TrialStore(db_path) as store:
+        files = store.files
+        trials = store.query()
+
+    counts = files.set_index('path')['num_trials']
+    scores = trials.groupby('file', observed=True)['sentence_pc'].sum()
+    for folder, num_trials, score in [('a', 2, 100), ('b', 3, 0)]:
+        path = str((folders / folder / 'P2001_2022_12_06_n_aided_RIC_7.csv')
+            .resolve())
+        assert counts[path] == num_trials
+        assert scores[path] == score
+    assert len(scores) == 3
+
+    model = speechmodel.SpeechModel.from_store(db_path, compact=False)
+    assert model.files == [Path(path) for path in files['path']]
+    assert len(model.data) == 6
+
+
+def test_query_numpy_scalars(folders, db_path):
+    speechmodel.SpeechModel(folders / 'b').ingest(db_path)
+    with trialstore.TrialStore(db_path) as store:
+        assert len(store.query(sub=np.int64(2001))) == 3
+        assert len(store.query(sub=np.array([2001, 2002]))) == 4
+        assert len(store.query(sub=2002, environment='n')) == 1
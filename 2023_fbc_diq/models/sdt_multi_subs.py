@@ -23,38 +23,40 @@ class SDT:
 
 
     def get_vals(self):
-        """ Loop through all subjects in provided dataframe.
-            Return a dataframe of subjects with d' and beta
-            columns.
+        """ Calculate SDT values for all subjects (rows) of the 
+            provided dataframe at once. The dataframe needs H, M,
+            FA and CR count columns, and is indexed by subject 
+            (or by subject and condition, etc.).
+            Return a dataframe of subjects with d', beta, c and
+            PC columns.
         """
-        results = []
         #temp = self.data.set_index('subject')
         temp = self.data.copy()
 
         print("\nsdtmodel: Counts for SDT proportions")
         print(temp)
 
-        for sub in temp.index:
-            # Proportions
-            self.pH, self.pFA, self.PC = self.rates(
-                temp.loc[sub, 'H'], 
-                temp.loc[sub, 'M'], 
-                temp.loc[sub, 'FA'], 
-                temp.loc[sub, 'CR']
-            )
+        # Proportions
+        counts = temp[['H', 'M', 'FA', 'CR']].to_numpy(dtype=float)
+        self.pH, self.pFA, self.PC = self.rates(*counts.T)
 
-            # z-scores
-            self.zH = self._p_to_z(self.pH)
-            self.zFA = self._p_to_z(self.pFA)
+        # z-scores (one ppf call per rate)
+        self.zH = self._p_to_z(self.pH)
+        self.zFA = self._p_to_z(self.pFA)
 
-            # Results
-            self.dprime = self.dprime_p(self.pH, self.pFA)
-            self.beta = self.beta_shortcut(self.pH, self.pFA)
+        # Results
+        self.dprime = self.dprime_z(self.zH, self.zFA)
+        self.beta = self.beta_z(self.zH, self.zFA)
+        self.c = self.criterion_z(self.zH, self.zFA)
 
-            results.append((sub, self.dprime, self.beta, self.PC))
-
-        return pd.DataFrame(results, 
-                            columns=["subject", "d_prime", "beta", "PC"])
+        results = temp.index.to_frame(index=False)
+        if temp.index.nlevels == 1:
+            results.columns = ["subject"]
+        results["d_prime"] = self.dprime
+        results["beta"] = self.beta
+        results["c"] = self.c
+        results["PC"] = self.PC
+        return results
 
 
     def _z_to_p(self, zscore):
@@ -66,7 +68,7 @@ class SDT:
 
     def _p_to_z(self, pval):
         """ Return the z-score associated with a given 
-            right-tail p-value.
+            right-tail p-value (or array of p-values).
         """
         zscore = stats.norm.ppf(1-pval)
         return zscore
@@ -119,7 +121,13 @@ class SDT:
         # Get z-scores
         zH = self._p_to_z(pH)
         zFA = self._p_to_z(pFA)
+        return self.beta_z(zH, zFA)
+
 
+    def beta_z(self, zH, zFA):
+        """ beta from z-scores (see beta_shortcut). Works on
+            scalars or arrays.
+        """
         # Get dprime
         dprime = self.dprime_z(zH, zFA)
         
@@ -135,6 +143,24 @@ class SDT:
         return beta
 
 
+    def criterion_p(self, pH, pFA):
+        """ Criterion location, c. 
+            c = 0: unbiased
+            c > 0: conservative (bias toward "no")
+            c < 0: liberal (bias toward "yes")
+        """
+        zH = self._p_to_z(pH)
+        zFA = self._p_to_z(pFA)
+        return self.criterion_z(zH, zFA)
+
+
+    def criterion_z(self, zH, zFA):
+        # _p_to_z returns right-tail z-scores, so 
+        # c = -(z(H) + z(FA)) / 2 = (zH + zFA) / 2
+        c = (zH + zFA) / 2
+        return c
+
+
     def rates(self, nH, nM, nFA, nCR):
         pH = nH/(nH+nM)
         pFA = nFA/(nFA+nCR)
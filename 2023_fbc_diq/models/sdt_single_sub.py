@@ -34,10 +34,11 @@ class SDT:
         self.zFA = self._p_to_z(self.pFA)
 
         # Results
-        self.dprime = self.dprime_p(self.pH, self.pFA)
-        self.beta = self.beta_shortcut(self.pH, self.pFA)
+        self.dprime = self.dprime_z(self.zH, self.zFA)
+        self.beta = self.beta_z(self.zH, self.zFA)
+        self.c = self.criterion_z(self.zH, self.zFA)
 
-        return self.dprime, self.beta, self.PC
+        return self.dprime, self.beta, self.c, self.PC
 
 
     def _z_to_p(self, zscore):
@@ -49,7 +50,7 @@ class SDT:
 
     def _p_to_z(self, pval):
         """ Return the z-score associated with a given 
-            right-tail p-value.
+            right-tail p-value (or array of p-values).
         """
         zscore = stats.norm.ppf(1-pval)
         return zscore
@@ -102,7 +103,13 @@ class SDT:
         # Get z-scores
         zH = self._p_to_z(pH)
         zFA = self._p_to_z(pFA)
+        return self.beta_z(zH, zFA)
 
+
+    def beta_z(self, zH, zFA):
+        """ beta from z-scores (see beta_shortcut). Works on
+            scalars or arrays.
+        """
         # Get dprime
         dprime = self.dprime_z(zH, zFA)
         
@@ -118,6 +125,24 @@ class SDT:
         return beta
 
 
+    def criterion_p(self, pH, pFA):
+        """ Criterion location, c. 
+            c = 0: unbiased
+            c > 0: conservative (bias toward "no")
+            c < 0: liberal (bias toward "yes")
+        """
+        zH = self._p_to_z(pH)
+        zFA = self._p_to_z(pFA)
+        return self.criterion_z(zH, zFA)
+
+
+    def criterion_z(self, zH, zFA):
+        # _p_to_z returns right-tail z-scores, so 
+        # c = -(z(H) + z(FA)) / 2 = (zH + zFA) / 2
+        c = (zH + zFA) / 2
+        return c
+
+
     def rates(self, nH, nM, nFA, nCR):
         pH = nH/(nH+nM)
         pFA = nFA/(nFA+nCR)
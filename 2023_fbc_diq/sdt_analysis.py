@@ -93,7 +93,8 @@ print(x)
 # for ii in range(0, len(df['subject'].unique())):
 #     s = sdt_single_sub.SDT(df.iloc[ii, 1], df.iloc[ii, 2], df.iloc[ii, 3], df.iloc[ii, 4])
 #     print(f"\nSubject {df.iloc[ii,0]}")
-#     dprime, beta = s.get_vals()
+#     dprime, beta, c, PC = s.get_vals()
 #     print(f"d-prime: {np.round(dprime, 2)}")
 #     print(f"beta: {np.round(beta, 2)}")
-#     print(f"PC: {s.PC}")
+#     print(f"c: {np.round(c, 2)}")
+#     print(f"PC: {PC}")
@@ -21,6 +21,9 @@ rcParams.update({'figure.autolayout': True})
 # Import system packages
 import os
 
+# Import custom modules
+from models import tables
+
 
 #########
 # BEGIN #
@@ -378,22 +381,22 @@ class DataModel:
             plt.close()
 
 
-    #################
-    # Write to .csv #
-    #################
+    ##########################
+    # Write to .csv/.parquet #
+    ##########################
     def write_estat_diffs(self, estat_diffs, title=None):
         # Check for custom title argument
         if not title:
             title = 'estat_diffs'
-        # Concatenate dict into single df and write to .csv
+        # Concatenate dict into single df and write to .csv/.parquet
         estat = pd.concat(estat_diffs.values(), ignore_index=True)
-        estat.to_csv(title+'.csv', index=False)
+        tables.write_table(estat, title+'.csv')
 
 
     def write_endstudy_diffs(self, endstudy_diffs, title=None):
         # Check for custom title argument
         if not title:
             title = 'endstudy_diffs'
-        # Concatenate dict into single df and write to .csv
+        # Concatenate dict into single df and write to .csv/.parquet
         estat = pd.concat(endstudy_diffs.values(), ignore_index=True)
-        estat.to_csv(title+'.csv', index=False)
+        tables.write_table(estat, title+'.csv')